@@ -6,11 +6,28 @@ Monitors Bash tool output for test failures, build errors, and runtime exception
 Suggests:
 - systematic-debugging: Always when errors detected (investigate before fixing)
 - testing-best-practices: When test failures detected (apply testing best practices)
+
+Patterns are audited once at load time and run in a bounded mode: lines are
+capped at MAX_LINE_LENGTH characters and the scan runs over chunks of at most
+CHUNK_LINES whole lines, checking a time budget between chunks. Patterns the
+audit flags as backtracking-prone, and every pattern once the budget is spent,
+fall back to a literal-only check so the hook never stalls. Patterns whose
+literals are too short to mean anything alone ("at") have no fallback.
+
+When the same command is run again in a session, only the delta against the
+previous run's failures is reported (new, resolved, still failing). Failure
+IDs are extracted under the rest of the same time budget; an incomplete or
+unavailable store falls back to the full suggestion.
 """
 
 import json
+import os
 import re
+import stat
 import sys
+import time
+from pathlib import Path
+from typing import NamedTuple
 
 # Error pattern categories
 TEST_FAILURE_PATTERNS = [
@@ -64,11 +81,198 @@ RUNTIME_ERROR_PATTERNS = [
     r'^\s+at\s+',  # Indented stack trace
 ]
 
+# Bounded execution limits
+MAX_LINE_LENGTH = 2000  # Characters of each output line considered by the patterns
+CHUNK_SIZE = 16384  # Characters of whole lines searched between deadline checks
+CHUNK_LINES = 256  # Lines per chunk: ^\s+ can cross blank lines, quadratic in their count
+MIN_FALLBACK_LITERAL = 4  # Shorter literals ("at", "×") are too common to match on alone
+TIME_BUDGET_SECONDS = 0.25  # Regex budget per invocation before literal-only fallback
+
+# Nested quantifier such as (a+)+ or (.*x)* - exponential backtracking risk
+NESTED_QUANTIFIER = re.compile(r'\((?:[^()\\]|\\.)*[*+](?:[^()\\]|\\.)*\)[*+{]')
+UNBOUNDED_WILDCARD = re.compile(r'(?<!\\)\.[*+]')
+
+
+class AuditedPattern(NamedTuple):
+    """A pattern after the load-time audit."""
+
+    source: str
+    regex: re.Pattern | None  # None when demoted to literal-only
+    literals: tuple[tuple[str, ...], ...] | None  # Any branch whose literals all appear
+    issues: tuple[str, ...]
+    fallback: bool = False  # The literals alone are evidence enough without the regex
 
-def detect_error_type(output: str) -> dict:
+
+def required_literals(pattern: str) -> tuple[tuple[str, ...], ...] | None:
+    """
+    Extract the literal text every match of the pattern must contain.
+    Returns one tuple of lowercase literals per top-level alternative, or None
+    when some alternative has no non-blank literal.
+    """
+    branches = []
+    runs: list[str] = []
+    current: list[str] = []
+    last_literal = False
+    depth = 0
+    i = 0
+
+    def end_run():
+        if "".join(current).strip():
+            runs.append("".join(current).lower())
+        current.clear()
+
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == "\\" and i + 1 < len(pattern):
+            escaped = pattern[i + 1]
+            if depth == 0 and not escaped.isalnum():
+                current.append(escaped)
+                last_literal = True
+            else:
+                end_run()
+                last_literal = False
+            i += 2
+            continue
+        if depth > 0:
+            if ch == "(":
+                depth += 1
+            elif ch == ")":
+                depth -= 1
+        elif ch == "[":
+            end_run()
+            last_literal = False
+            close = pattern.find("]", i + 2 if pattern[i + 1 : i + 2] == "]" else i + 1)
+            i = len(pattern) if close == -1 else close
+        elif ch == "(":
+            end_run()
+            last_literal = False
+            depth += 1
+        elif ch == "|":
+            end_run()
+            if not runs:
+                return None
+            branches.append(tuple(runs))
+            runs = []
+            last_literal = False
+        elif ch in "*?{":
+            # The preceding literal character is optional
+            if last_literal and current:
+                current.pop()
+            end_run()
+            if ch == "{":
+                close = pattern.find("}", i)
+                i = len(pattern) if close == -1 else close
+            last_literal = False
+        elif ch in ".^$+)":
+            end_run()
+            last_literal = False
+        else:
+            current.append(ch)
+            last_literal = True
+        i += 1
+
+    end_run()
+    if not runs:
+        return None
+    branches.append(tuple(runs))
+    return tuple(branches)
+
+
+def audit_pattern(pattern: str) -> AuditedPattern:
+    """Compile a pattern and flag constructs that can backtrack heavily."""
+    issues = []
+    try:
+        regex = re.compile(pattern, re.IGNORECASE | re.MULTILINE)
+    except re.error as e:
+        return AuditedPattern(pattern, None, None, (f"invalid: {e}",))
+
+    literals = required_literals(pattern)
+    if NESTED_QUANTIFIER.search(pattern):
+        issues.append("nested quantifier")
+        # Literal-only when possible; a literal-free pattern is dropped
+        regex = None
+    if len(UNBOUNDED_WILDCARD.findall(pattern)) > 1:
+        issues.append("multiple unbounded wildcards")
+
+    fallback = literals is not None and all(
+        max(len(lit.strip()) for lit in branch) >= MIN_FALLBACK_LITERAL for branch in literals
+    )
+    return AuditedPattern(pattern, regex, literals, tuple(issues), fallback)
+
+
+AUDITED_PATTERNS = {
+    "test_failure": [audit_pattern(p) for p in TEST_FAILURE_PATTERNS],
+    "build_error": [audit_pattern(p) for p in BUILD_ERROR_PATTERNS],
+    "runtime_error": [audit_pattern(p) for p in RUNTIME_ERROR_PATTERNS],
+}
+
+# Individual failure identifiers, used to diff reruns of the same command.
+# Indentation is [ \t]*, not \s*, so no pattern runs across blank lines
+FAILURE_ID_PATTERNS = [
+    re.compile(r'^(?:FAILED|ERROR) (\S+)', re.MULTILINE),  # pytest short summary
+    re.compile(r'^[ \t]*--- FAIL: (\S+)', re.MULTILINE),  # go test
+    re.compile(r'^test (\S+) \.\.\. FAILED', re.MULTILINE),  # cargo test
+    re.compile(r'^[ \t]*FAIL[ \t]+(\S+)', re.MULTILINE),  # jest/vitest test files
+    re.compile(r'^[ \t]*[✕×✗][ \t]+(.+?)(?:[ \t]+\(\d+[ \t]*m?s\))?$', re.MULTILINE),  # jest/vitest
+    re.compile(r'^(\S+)\(\d+,\d+\): error (TS\d+)', re.MULTILINE),  # tsc
+]
+
+# Trailing output shaping that doesn't change what a command runs
+OUTPUT_SHAPING = re.compile(r'(?:\s*2>&1|\s*\|\s*(?:head|tail)\b[^|]*)+$')
+
+# Per-session failure store
+STATE_DIR_ENV = "AJBM_HOOK_STATE_DIR"
+STORE_FILE = "error-detection.json"
+MAX_STORED_COMMANDS = 20  # Least recently run commands are evicted first
+MAX_FAILURES_PER_COMMAND = 200
+MAX_COMMAND_KEY_LENGTH = 500
+MAX_LISTED_FAILURES = 10
+
+CATEGORY_LABELS = {"test_failure": "test", "build_error": "build", "runtime_error": "runtime"}
+
+
+def cap_line_length(output: str, limit: int = MAX_LINE_LENGTH) -> str:
+    """Truncate every line to limit characters (minified bundles, base64 blobs)."""
+    if len(output) <= limit:
+        return output
+    lines = output.split("\n")
+    if all(len(line) <= limit for line in lines):
+        return output
+    return "\n".join(line[:limit] for line in lines)
+
+
+def line_chunks(text: str, size: int = CHUNK_SIZE, max_lines: int = CHUNK_LINES) -> list[str]:
+    """
+    Split text into chunks of whole lines, ending a chunk once it holds more
+    than size characters or max_lines lines. Consecutive chunks share a line,
+    so a pattern spanning two lines (error: ...\n ... ^) is always seen whole
+    by one chunk.
+    """
+    if len(text) <= size and text.count("\n") < max_lines:
+        return [text]
+    lines = text.split("\n")
+    chunks = []
+    start = 0
+    length = 0
+    for i, line in enumerate(lines[:-1]):
+        length += len(line) + 1
+        if length > size or i - start + 1 >= max_lines:
+            chunks.append("\n".join(lines[start : i + 1]))
+            start, length = i, len(line) + 1
+    chunks.append("\n".join(lines[start:]))
+    return chunks
+
+
+def literals_present(literals: tuple[tuple[str, ...], ...], lowered: str) -> bool:
+    """Check whether every literal of at least one alternative appears in the text."""
+    return any(all(lit in lowered for lit in branch) for branch in literals)
+
+
+def detect_error_type(output: str, time_budget: float = TIME_BUDGET_SECONDS) -> dict:
     """
     Analyze output for error patterns.
     Returns dict with error types detected and matched patterns.
+    "degraded" is set when the time budget ran out and literal-only checks were used.
     """
     result = {
         "has_error": False,
@@ -76,35 +280,196 @@ def detect_error_type(output: str) -> dict:
         "build_error": False,
         "runtime_error": False,
         "matched_patterns": [],
+        "degraded": False,
     }
 
-    # Check for test failures
-    for pattern in TEST_FAILURE_PATTERNS:
-        if re.search(pattern, output, re.IGNORECASE | re.MULTILINE):
-            result["has_error"] = True
-            result["test_failure"] = True
-            result["matched_patterns"].append(f"test: {pattern}")
-            break  # One match is enough per category
-
-    # Check for build errors
-    for pattern in BUILD_ERROR_PATTERNS:
-        if re.search(pattern, output, re.IGNORECASE | re.MULTILINE):
-            result["has_error"] = True
-            result["build_error"] = True
-            result["matched_patterns"].append(f"build: {pattern}")
-            break
-
-    # Check for runtime errors
-    for pattern in RUNTIME_ERROR_PATTERNS:
-        if re.search(pattern, output, re.IGNORECASE | re.MULTILINE):
-            result["has_error"] = True
-            result["runtime_error"] = True
-            result["matched_patterns"].append(f"runtime: {pattern}")
-            break
+    text = cap_line_length(output)
+    lowered = text.lower()
+    chunks = line_chunks(text)
+    deadline = time.perf_counter() + time_budget
+
+    for category, patterns in AUDITED_PATTERNS.items():
+        for audited in patterns:
+            # Literal prefilter: skip the regex when a required literal is missing
+            if audited.literals is not None and not literals_present(audited.literals, lowered):
+                continue
+
+            matched = False
+            if audited.regex is not None and not result["degraded"]:
+                # One search can't be interrupted, so the budget is checked per chunk
+                for chunk in chunks:
+                    if time.perf_counter() > deadline:
+                        result["degraded"] = True
+                        break
+                    if audited.regex.search(chunk):
+                        matched = True
+                        break
+            if not matched and (audited.regex is None or result["degraded"]):
+                # Literal-only check, for patterns whose literals are specific enough
+                matched = audited.fallback
+
+            if matched:
+                result["has_error"] = True
+                result[category] = True
+                result["matched_patterns"].append(f"{CATEGORY_LABELS[category]}: {audited.source}")
+                break  # One match is enough per category
 
     return result
 
 
+def format_audit() -> str:
+    """Format the load-time pattern audit for `--audit`."""
+    lines = []
+    for category, patterns in AUDITED_PATTERNS.items():
+        lines.append(f"{category}:")
+        for audited in patterns:
+            mode = "regex" if audited.regex is not None else "literal-only"
+            if audited.literals and not audited.fallback:
+                mode += " (no literal fallback)"
+            literals = " | ".join(" & ".join(b) for b in audited.literals or ()) or "-"
+            issues = f"  [{', '.join(audited.issues)}]" if audited.issues else ""
+            lines.append(f"  {audited.source!r}: {mode}, literals: {literals}{issues}")
+    return "\n".join(lines)
+
+
+def extract_failures(output: str, time_budget: float = TIME_BUDGET_SECONDS) -> set[str] | None:
+    """
+    Extract identifiers of individual failing tests or errors, scanning the
+    same line chunks as detect_error_type(). Returns None if the time budget
+    runs out: a partial list would report the rest as resolved.
+    """
+    chunks = line_chunks(cap_line_length(output))
+    deadline = time.perf_counter() + time_budget
+    failures = set()
+    for pattern in FAILURE_ID_PATTERNS:
+        for chunk in chunks:
+            if time.perf_counter() > deadline:
+                return None
+            for match in pattern.finditer(chunk):
+                failures.add(" ".join(g for g in match.groups() if g))
+                if len(failures) >= MAX_FAILURES_PER_COMMAND:
+                    return failures
+    return failures
+
+
+def normalize_command(command: str) -> str:
+    """Normalize command text so reruns of the same command share a key."""
+    command = " ".join(command.split())
+    command = OUTPUT_SHAPING.sub("", command)
+    return command[:MAX_COMMAND_KEY_LENGTH]
+
+
+def state_dir() -> str:
+    """Per-user directory for hook state shared across invocations."""
+    base = os.environ.get(STATE_DIR_ENV)
+    if not base:
+        tmp = os.environ.get("TMPDIR") or os.environ.get("TEMP") or "/tmp"
+        name = f"ajbm-hooks-{os.getuid()}" if hasattr(os, "getuid") else "ajbm-hooks"
+        base = os.path.join(tmp, name)
+    return base
+
+
+def private_state_dir() -> str | None:
+    """
+    Return the state dir, created with mode 0700, if it belongs to this user
+    and no one else can write to it. Stored failure IDs are shown to the
+    model, so a store another account could plant is never read.
+    """
+    path = state_dir()
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        info = os.lstat(path)
+    except OSError:
+        return None
+    if not stat.S_ISDIR(info.st_mode) or info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        return None
+    if hasattr(os, "getuid") and info.st_uid != os.getuid():
+        return None
+    return path
+
+
+def store_path(session_id: str) -> Path | None:
+    """Return a session's failure store path; None without a session or private state dir."""
+    session = re.sub(r'[^A-Za-z0-9_-]', "", session_id)
+    if not session:
+        return None
+    state = private_state_dir()
+    return Path(state) / session / STORE_FILE if state else None
+
+
+def load_store(path: Path) -> dict[str, list[str]]:
+    """Load the per-session store (command key -> failures), oldest first."""
+    try:
+        with open(path) as f:
+            store = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return store if isinstance(store, dict) else {}
+
+
+def save_store(path: Path, store: dict[str, list[str]]) -> None:
+    """Write the store atomically, keeping only the most recent commands."""
+    while len(store) > MAX_STORED_COMMANDS:
+        del store[next(iter(store))]
+    path.parent.mkdir(exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(store, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def update_failure_store(path: Path, command: str, failures: set[str]) -> set[str] | None:
+    """
+    Record the failures of this run and return those of the previous run of
+    the same command, or None if it hasn't been seen this session.
+    """
+    store = load_store(path)
+    key = normalize_command(command)
+    previous = store.pop(key, None)
+
+    # Re-inserting moves the command to the most recently used end
+    if failures:
+        store[key] = sorted(failures)
+    if failures or previous is not None:
+        save_store(path, store)
+
+    return set(previous) if previous is not None else None
+
+
+def format_failure_list(label: str, failures: set[str]) -> list[str]:
+    """Format a bounded list of failure identifiers."""
+    if not failures:
+        return []
+    ordered = sorted(failures)
+    lines = [f"{label} ({len(ordered)}):"]
+    lines.extend(f"  - {failure}" for failure in ordered[:MAX_LISTED_FAILURES])
+    if len(ordered) > MAX_LISTED_FAILURES:
+        lines.append(f"  ... and {len(ordered) - MAX_LISTED_FAILURES} more")
+    return lines
+
+
+def format_delta(previous: set[str], current: set[str]) -> str:
+    """Format new/resolved failures compared with the previous run."""
+    new = current - previous
+    resolved = previous - current
+    still = current & previous
+
+    if not current:
+        return f"✅ All {len(previous)} previous failures resolved since last run of this command."
+    if not new:
+        summary = f"No new failures since last run of this command: {len(still)} still failing"
+        if resolved:
+            summary += f", {len(resolved)} resolved"
+        return "\n".join([summary + "."] + format_failure_list("Resolved", resolved))
+
+    lines = ["Changes since last run of this command:"]
+    lines.extend(format_failure_list("New failures", new))
+    lines.extend(format_failure_list("Resolved", resolved))
+    if still:
+        lines.append(f"Still failing: {len(still)}")
+    return "\n".join(lines)
+
+
 def format_suggestion(error_info: dict) -> str:
     """Format the skill suggestion based on detected errors."""
     if not error_info["has_error"]:
@@ -148,6 +513,10 @@ def format_suggestion(error_info: dict) -> str:
 
 def main():
     """Main entry point."""
+    if sys.argv[1:] == ["--audit"]:
+        print(format_audit())
+        sys.exit(0)
+
     try:
         # Read JSON input from stdin
         input_data = sys.stdin.read()
@@ -159,6 +528,8 @@ def main():
         # PostToolUse provides tool_name and tool_output
         tool_name = payload.get("tool_name", "")
         tool_output = payload.get("tool_output", "")
+        command = payload.get("tool_input", {}).get("command", "")
+        session_id = payload.get("session_id", "")
 
         # Only process Bash tool output
         if tool_name != "Bash":
@@ -169,10 +540,30 @@ def main():
             sys.exit(0)
 
         # Detect errors in output
+        started = time.perf_counter()
         error_info = detect_error_type(tool_output)
 
-        # Output suggestion if errors found
+        # Diff individual failures against the previous run of this command,
+        # within what is left of the time budget
+        failures: set[str] | None = set()
         if error_info["has_error"]:
+            remaining = TIME_BUDGET_SECONDS - (time.perf_counter() - started)
+            failures = extract_failures(tool_output, max(remaining, 0.0))
+        path = store_path(session_id) if command else None
+        previous = None
+        if path is not None and failures is not None and (failures or not error_info["has_error"]):
+            try:
+                previous = update_failure_store(path, command, failures)
+            except OSError:
+                previous = None  # Unwritable store: report as on a first run
+
+        if previous is not None and failures is not None and (previous or failures):
+            # Full suggestion only when something regressed
+            if failures - previous:
+                print(format_suggestion(error_info))
+            print(format_delta(previous, failures))
+        elif error_info["has_error"]:
+            # Output suggestion if errors found
             suggestion = format_suggestion(error_info)
             print(suggestion)
 
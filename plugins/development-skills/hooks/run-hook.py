@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Hook launcher: runs hooks/<name>.py as __main__ from cached bytecode.
+
+Python only caches .pyc files for imported modules, so a hook started as
+`python3 hook.py` is recompiled on every call. This launcher loads the hook
+through SourceFileLoader, which reads and writes __pycache__, and hooks.json
+starts it with -S -E so no site-packages or environment tweaks are processed.
+When the plugin directory is read-only, bytecode prebuilt into its __pycache__
+(scripts/build_hooks.py) is used as long as no other user can write to it;
+otherwise bytecode goes to the per-user state dir.
+
+Each call also appends one telemetry line (hook, session, interpreter startup,
+wall time in the launcher, payload size, exit code) to a log shared by all
+plugins; see hook-stats.py. Startup is the process's CPU time on entering
+main(), so waits on disk aren't counted; /proc/self/stat's start time would
+include them, but only in clock ticks (usually 10ms), too coarse for a
+startup of 20-35ms.
+
+Usage: python3 -S -E run-hook.py <hook-name> [args...]
+"""
+
+import io
+import os
+import stat
+import sys
+import time
+from importlib.machinery import SourceFileLoader
+
+HOOKS_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_DIR_ENV = "AJBM_HOOK_STATE_DIR"
+TELEMETRY_FILE = "hook-telemetry.jsonl"
+MAX_TELEMETRY_BYTES = 2 * 1024 * 1024  # Rotated to a single .1 backup
+
+
+def state_dir() -> str:
+    """Per-user directory for hook state shared across invocations."""
+    base = os.environ.get(STATE_DIR_ENV)
+    if not base:
+        tmp = os.environ.get("TMPDIR") or os.environ.get("TEMP") or "/tmp"
+        name = f"ajbm-hooks-{os.getuid()}" if hasattr(os, "getuid") else "ajbm-hooks"
+        base = os.path.join(tmp, name)
+    return base
+
+
+def private_state_dir() -> str | None:
+    """Return the state dir, created with mode 0700, if only this user can write to it."""
+    path = state_dir()
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        info = os.lstat(path)
+    except OSError:
+        return None
+    if not stat.S_ISDIR(info.st_mode) or info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        return None
+    if hasattr(os, "getuid") and info.st_uid != os.getuid():
+        return None
+    return path
+
+
+def writable_by_others(path: str) -> bool:
+    return bool(os.stat(path).st_mode & (stat.S_IWGRP | stat.S_IWOTH))
+
+
+def pycache_prefix(path: str) -> str | None:
+    """
+    Return where to cache the hook's bytecode instead of hooks/__pycache__:
+    None while the plugin directory is writable or holds trusted prebuilt
+    bytecode. Cached bytecode is executed, so it is only read from places
+    no one else can write to.
+    """
+    if os.access(HOOKS_DIR, os.W_OK):
+        return None
+    name = os.path.splitext(os.path.basename(path))[0]
+    pycache = os.path.join(HOOKS_DIR, "__pycache__")
+    prebuilt = os.path.join(pycache, f"{name}.{sys.implementation.cache_tag}.pyc")
+    try:
+        if not writable_by_others(pycache) and not writable_by_others(prebuilt):
+            return None
+    except OSError:
+        pass  # Not prebuilt
+    state = private_state_dir()
+    return os.path.join(state, "pycache") if state else None
+
+
+def session_id(payload: str) -> str:
+    """Pull session_id out of the payload without parsing it."""
+    key = payload.find('"session_id"')
+    if key < 0:
+        return ""
+    start = payload.find('"', payload.find(":", key) + 1) + 1
+    value = payload[start : payload.find('"', start)] if start else ""
+    return "".join(ch for ch in value[:64] if ch.isalnum() or ch in "-_")
+
+
+def record(name: str, payload: str, exit_code: int, startup: float, started: float) -> None:
+    """
+    Append one telemetry line with a single O_APPEND write, so concurrent hooks
+    never interleave lines. Formatted by hand: no json import on the hot path.
+    """
+    elapsed_us = int((time.perf_counter() - started) * 1_000_000)
+    line = (
+        f'{{"ts":{int(time.time())},"hook":"{name}","session":"{session_id(payload)}",'
+        f'"startup_us":{int(startup * 1_000_000)},"us":{elapsed_us},'
+        f'"size":{len(payload)},"exit":{exit_code}}}\n'
+    )
+    path = os.path.join(state_dir(), TELEMETRY_FILE)
+    try:
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            os.write(fd, line.encode())
+            if os.fstat(fd).st_size > MAX_TELEMETRY_BYTES:
+                os.replace(path, f"{path}.1")
+        finally:
+            os.close(fd)
+    except OSError:
+        pass  # Telemetry never affects a hook
+
+
+def main() -> None:
+    startup = time.process_time()
+    started = time.perf_counter()
+    if len(sys.argv) < 2:
+        print("usage: run-hook.py <hook-name> [args...]", file=sys.stderr)
+        sys.exit(0)  # A broken hook command never blocks a tool call
+    name = sys.argv.pop(1)
+    path = os.path.join(HOOKS_DIR, f"{name}.py")
+    sys.argv[0] = path
+
+    prefix = pycache_prefix(path)
+    if prefix:
+        sys.pycache_prefix = prefix
+
+    # Buffer the payload so its size can be recorded; interactive runs aren't recorded
+    payload = None
+    if sys.stdin is not None and not sys.stdin.isatty():
+        payload = sys.stdin.read()
+        sys.stdin = io.StringIO(payload)
+
+    exit_code = 1
+    try:
+        code = SourceFileLoader("__main__", path).get_code("__main__")
+        exec(code, {"__name__": "__main__", "__file__": path, "__builtins__": __builtins__})
+        exit_code = 0
+    except SystemExit as exc:
+        exit_code = exc.code if isinstance(exc.code, int) else int(exc.code is not None)
+        raise
+    finally:
+        if payload is not None:
+            record(name, payload, exit_code, startup, started)
+
+
+if __name__ == "__main__":
+    main()
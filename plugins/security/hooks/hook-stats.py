@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Report how much time hooks add to each turn, from the telemetry run-hook.py
+appends for every hook call (all plugins share one log).
+
+Per hook: calls, sessions, calls per session, p50/p95/p99 time per call,
+median interpreter startup, blocks, errors and total time added. Time per
+call is interpreter startup (CPU time before the launcher ran) plus wall time
+inside the launcher; records written before startup was logged count only
+the latter.
+
+Usage: python3 hook-stats.py [telemetry.jsonl]
+"""
+
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Any
+
+STATE_DIR_ENV = "AJBM_HOOK_STATE_DIR"
+TELEMETRY_FILE = "hook-telemetry.jsonl"
+BLOCK_EXIT_CODE = 2
+
+
+def state_dir() -> Path:
+    """Per-user directory for hook state shared across invocations."""
+    base = os.environ.get(STATE_DIR_ENV)
+    if not base:
+        tmp = os.environ.get("TMPDIR") or os.environ.get("TEMP") or "/tmp"
+        name = f"ajbm-hooks-{os.getuid()}" if hasattr(os, "getuid") else "ajbm-hooks"
+        base = os.path.join(tmp, name)
+    return Path(base)
+
+
+def read_records(path: Path) -> list[dict[str, Any]]:
+    """Read the telemetry log and its rotated backup, oldest first."""
+    records = []
+    for current in (path.with_name(f"{path.name}.1"), path):
+        try:
+            with open(current) as f:
+                lines = f.readlines()
+        except OSError:
+            continue
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue  # Torn or foreign line
+    return records
+
+
+def percentile(sorted_values: list[int], pct: float) -> int:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def format_stats(records: list[dict[str, Any]]) -> str:
+    """Per-hook latency percentiles, calls per session and total added time."""
+
+    def call_us(record: dict[str, Any]) -> int:
+        return record.get("startup_us", 0) + record.get("us", 0)
+
+    if not records:
+        return "No hook calls recorded."
+
+    by_hook: dict[str, list[dict[str, Any]]] = {}
+    for record in records:
+        by_hook.setdefault(record.get("hook", "?"), []).append(record)
+
+    lines = [
+        f"{'hook':<24} {'calls':>7} {'sessions':>8} {'/session':>8} {'p50 ms':>7} "
+        f"{'p95 ms':>7} {'p99 ms':>7} {'blocked':>7} {'errors':>6} {'startup ms':>10} "
+        f"{'total s':>8}"
+    ]
+    for hook, hook_records in sorted(by_hook.items(), key=lambda item: -len(item[1])):
+        latencies = sorted(call_us(r) for r in hook_records)
+        startups = sorted(r.get("startup_us", 0) for r in hook_records)
+        sessions = len({r.get("session") for r in hook_records})
+        blocked = sum(1 for r in hook_records if r.get("exit") == BLOCK_EXIT_CODE)
+        errors = sum(1 for r in hook_records if r.get("exit") not in (0, BLOCK_EXIT_CODE))
+        lines.append(
+            f"{hook:<24} {len(hook_records):>7} {sessions:>8} {len(hook_records) / sessions:>8.1f} "
+            f"{percentile(latencies, 50) / 1000:>7.1f} {percentile(latencies, 95) / 1000:>7.1f} "
+            f"{percentile(latencies, 99) / 1000:>7.1f} {blocked:>7} {errors:>6} "
+            f"{percentile(startups, 50) / 1000:>10.1f} {sum(latencies) / 1_000_000:>8.2f}"
+        )
+
+    total_us = sum(call_us(r) for r in records)
+    startup_us = sum(r.get("startup_us", 0) for r in records)
+    sessions = len({r.get("session") for r in records})
+    lines.extend(
+        [
+            "",
+            f"Total added: {total_us / 1_000_000:.2f}s over {len(records)} calls "
+            f"in {sessions} sessions ({total_us / sessions / 1000:.0f}ms per session, "
+            f"{startup_us / 1_000_000:.2f}s of it interpreter startup)",
+        ]
+    )
+    return "\n".join(lines)
+
+
+def main() -> int:
+    path = Path(sys.argv[1]) if len(sys.argv) > 1 else state_dir() / TELEMETRY_FILE
+    print(format_stats(read_records(path)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,164 +3,1703 @@
 Smart PreToolUse guard for Claude:
 - Blocks truly dangerous operations without being intrusive
 - Prevents reading/writing sensitive files
+- Prevents Grep from printing the contents of sensitive files
 - Blocks destructive commands
+
+Rules come in layers (built-in, user, project) compiled into a cached policy
+bundle; see load_policy(). Paths are canonicalized (~, .., symlinks, hard
+links to known secrets) before matching. Decisions are cached per session
+(see SessionCache), stamped with a hash of the rule tables so any pattern
+change invalidates them.
+
+Every decision is appended to an audit log; `smart-guard.py --audit-summary`
+reports block rates and latency percentiles from it.
+
+Hooks start a fresh interpreter per call, so modules only some tools need
+(shlex, hashlib, fnmatch, marshal) are imported where they are used.
 """
 
+import functools
 import json
+import os
 import re
+import stat
 import sys
-from typing import Any
-
-# Files that should NEVER be read or modified
-SENSITIVE_FILES = [
-    r"(^|/)\.env(\.[^/]*)?$",  # .env files (must be actual filename)
-    r"(^|/)\devcontainer.local(\.[^/]*)?$",  # devcontainer secrets file (must be actual filename)
-    r"(^|/)\.ssh(/|$)",  # SSH directory
-    r"\.(pem|key|crt|cer|pfx|p12)$",  # Private keys and certificates
-    r"(^|/)\.netrc$",  # Network credentials
-    r"(^|/)\.npmrc$",  # NPM credentials
-    r"(^|/)\.pypirc$",  # PyPI credentials
-    r"(^|/)\.aws/credentials",  # AWS credentials
-    r"(^|/)\.kube/config",  # Kubernetes config
-    r"(^|/)etc/shadow",  # System passwords
-    r"(^|/)\.gnupg(/|$)",  # GPG keys directory
-]
-
-# Dangerous bash patterns
-DANGEROUS_COMMANDS = [
-    r"\brm\s+-rf\s+/(?:\s|$)",  # rm -rf / (root)
-    r"\brm\s+-rf\s+\*(?:\s|$)",  # rm -rf * (everything in current dir)
-    r"\brm\s+-rf\s+\.\.(?:/|\s|$)",  # rm -rf .. (parent directory)
-    r"\brm\s+-rf\s+~(?:/|\s|$)",  # rm -rf ~/ (home directory)
-    r">\s*/dev/[sh]d[a-z]",  # Overwrite disk devices
-    r"\bdd\s+.*\bof=/dev/[sh]d[a-z](?:\d)?(?:\s|$)",  # dd to disk devices
-    r"\bmkfs\.\w+",  # Format filesystem commands
-    r":\(\)\s*\{\s*:\|\s*:&\s*\}",  # Fork bomb pattern
-    r"\bchmod\s+777\s+/",  # chmod 777 on root
-    r"\>\s*/dev/null\s*&&\s*rm",  # Destructive redirects with rm
-]
+import time
+import zlib
+from typing import Any, NamedTuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: cache writes stay atomic, just unlocked
+    fcntl = None
+
+# Files that should NEVER be read or modified (rule name -> (kind, values))
+#   name:   the file name is one of values
+#   family: the file name is one of values, optionally followed by ".<suffix>"
+#   ext:    the file name ends with one of values
+#   dir:    any path component is one of values
+#   path:   consecutive components spell one of values (last one matched as a prefix)
+#   regex:  the path matches one of values (policy files only; slower than the above)
+SENSITIVE_FILES = {
+    "env_file": ("family", (".env",)),  # .env files (must be actual filename)
+    # devcontainer secrets file
+    "devcontainer_local": ("family", ("devcontainer.local", ".devcontainer.local")),
+    "ssh_dir": ("dir", (".ssh",)),  # SSH directory
+    # Private keys and certificates
+    "key_or_cert": ("ext", (".pem", ".key", ".crt", ".cer", ".pfx", ".p12")),
+    "netrc": ("name", (".netrc",)),  # Network credentials
+    "npmrc": ("name", (".npmrc",)),  # NPM credentials
+    "pypirc": ("name", (".pypirc",)),  # PyPI credentials
+    "aws_credentials": ("path", (".aws/credentials",)),  # AWS credentials
+    "kube_config": ("path", (".kube/config",)),  # Kubernetes config
+    "etc_shadow": ("path", ("etc/shadow",)),  # System passwords
+    "gnupg_dir": ("dir", (".gnupg",)),  # GPG keys directory
+    "guard_policy": ("path", (".claude/smart-guard.json",)),  # This guard's own policy files
+}
+
+# Dangerous bash patterns (rule name -> pattern)
+DANGEROUS_COMMANDS = {
+    "rm_rf_root": r"\brm\s+-rf\s+/(?:\s|$)",  # rm -rf / (root)
+    "rm_rf_wildcard": r"\brm\s+-rf\s+\*(?:\s|$)",  # rm -rf * (everything in current dir)
+    "rm_rf_parent": r"\brm\s+-rf\s+\.\.(?:/|\s|$)",  # rm -rf .. (parent directory)
+    "rm_rf_home": r"\brm\s+-rf\s+~(?:/|\s|$)",  # rm -rf ~/ (home directory)
+    "disk_overwrite": r">\s*/dev/[sh]d[a-z]",  # Overwrite disk devices
+    "dd_to_disk": r"\bdd\s+.*\bof=/dev/[sh]d[a-z](?:\d)?(?:\s|$)",  # dd to disk devices
+    "mkfs": r"\bmkfs\.\w+",  # Format filesystem commands
+    "fork_bomb": r":\(\)\s*\{\s*:\|\s*:&\s*\}",  # Fork bomb pattern
+    "chmod_777_root": r"\bchmod\s+777\s+/",  # chmod 777 on root
+    "null_redirect_rm": r"\>\s*/dev/null\s*&&\s*rm",  # Destructive redirects with rm
+}
+
+# Commands that print the files given as operands
+FILE_READERS = {
+    "cat", "tac", "nl", "less", "more", "head", "tail", "bat", "strings",
+    "xxd", "hexdump", "od", "base64",
+}
+
+# Readers whose first operand is a pattern or script unless one is given by option
+SCRIPT_READERS = {"grep", "egrep", "fgrep", "rg", "awk", "gawk", "sed"}
+
+# Options that take a value: "file" values are read, "script" values replace the
+# first operand, "value" values are skipped. Unlisted options take no value.
+READER_OPTIONS = {
+    "head": {"-n": "value", "-c": "value", "--lines": "value", "--bytes": "value"},
+    "tail": {"-n": "value", "-c": "value", "--lines": "value", "--bytes": "value"},
+    "grep": {
+        "-e": "script", "--regexp": "script", "-f": "file", "--file": "file",
+        "-A": "value", "-B": "value", "-C": "value", "-m": "value",
+    },
+    "rg": {
+        "-e": "script", "--regexp": "script", "-f": "file", "--file": "file",
+        "-A": "value", "-B": "value", "-C": "value", "-m": "value",
+        "-g": "value", "--glob": "value", "-t": "value", "--type": "value",
+    },
+    "awk": {"-f": "file", "-F": "value", "-v": "value"},
+    "sed": {"-e": "script", "--expression": "script", "-f": "file", "--file": "file"},
+}
+READER_OPTIONS["egrep"] = READER_OPTIONS["fgrep"] = READER_OPTIONS["grep"]
+READER_OPTIONS["gawk"] = READER_OPTIONS["awk"]
+
+# Wrappers that run the command that follows them, with their options that take
+# a value (sudo -u root cat ...). timeout also takes a duration before the command.
+COMMAND_PREFIXES = {
+    "sudo": {
+        "-u", "-g", "-h", "-p", "-r", "-t", "-U", "-C", "-D", "-T", "--user", "--group",
+        "--host", "--prompt", "--role", "--type", "--other-user", "--close-from", "--chdir",
+        "--command-timeout",
+    },
+    "env": {"-u", "-C", "-S", "--unset", "--chdir", "--split-string"},
+    "nice": {"-n", "--adjustment"},
+    "time": {"-f", "-o", "--format", "--output"},
+    "exec": {"-a"},
+    "timeout": {"-s", "-k", "--signal", "--kill-after"},
+    "stdbuf": {"-i", "-o", "-e", "--input", "--output", "--error"},
+    "xargs": {
+        "-I", "-n", "-P", "-d", "-L", "-s", "-E", "-a", "--replace", "--max-args",
+        "--max-procs", "--delimiter", "--max-lines", "--max-chars", "--eof", "--arg-file",
+    },
+    "command": set(),
+    "builtin": set(),
+    "nohup": set(),
+}
+PREFIX_OPERANDS = {"timeout": 1}  # Operands before the command
+ENV_SPLIT_OPTIONS = {"-S", "--split-string"}  # Value is split into the command
+
+# Reserved words that may lead a simple command ({ cat .env; }, if true; then ...)
+SHELL_KEYWORDS = {
+    "{", "}", "!", "if", "then", "elif", "else", "fi", "do", "done", "while", "until", "esac",
+}
+# Reserved words whose simple command is a header, not a command (for x in a b)
+SHELL_HEADERS = {"for", "case", "select"}
+
+# Shells whose -c argument is parsed as a nested command
+SHELLS = {"sh", "bash", "zsh", "dash", "ksh"}
+MAX_NESTED_SHELL_DEPTH = 3
+
+SHELL_PUNCTUATION = set("();<>|&")
+
+# Patterns below are kept as source and compiled on first use (re caches them),
+# so a Read never compiles the Bash parsing patterns
+
+# shlex builds tokens a character at a time (quadratic in token length), so
+# runs of characters with no shell meaning in any context are swapped for
+# placeholders before lexing and restored afterwards
+LONG_LITERAL_RUN = r"[^\s'\"\\;&|()<>`$#\ue000-\ue004]{256,}"
+PLACEHOLDER = "\ue000(\\d+)\ue001"
+
+# $( and ` start new commands. They are swapped for markers that split unquoted
+# words and are restored inside quoted ones, so sh -c '...' keeps its text
+SUBSTITUTION_MARKERS = {"$(": " \ue003 ", "`": " \ue004 "}
+
+# Quote and substitution boundaries, and parentheses, for finding $(...) and
+# `...` inside double quotes (escaped characters are matched to be skipped)
+QUOTE_EVENT = r"(?s)\\.|[\"'`]|\$\("
+PAREN_EVENT = r"(?s)\\.|[()]"
+
+# A "#" inside a word (x#y, $#) doesn't start a comment in the shell, but does
+# in shlex, which would hide the rest of the line ("true x#; cat .env")
+MID_WORD_HASH = r"(?<=[^\s;&|()<>])#"
+
+# Targets of a recursive rm that wipe far more than intended (after stripping
+# trailing "/" and "/*"), mapped to the DANGEROUS_COMMANDS rule they belong to
+RM_TARGET_RULES = {
+    "/": "rm_rf_root",
+    "~": "rm_rf_home",
+    "$HOME": "rm_rf_home",
+    "${HOME}": "rm_rf_home",
+    "..": "rm_rf_parent",
+    "*": "rm_rf_wildcard",
+    ".": "rm_rf_wildcard",
+}
+
+# Interpreters whose first operand is a script file. Shell scripts get every
+# Bash check; other scripts are checked against the dangerous-command patterns
+SCRIPT_INTERPRETERS = {"python", "python3", "node", "perl", "ruby", "php"}
+SOURCE_COMMANDS = {"source", "."}
+INLINE_CODE_OPTIONS = {"-c", "-e", "-m", "--eval"}  # Code given inline: no script file
+INTERPRETER_OPTIONS = {"-o", "+o", "-O", "+O", "-W", "-X", "-r", "--require"}  # Take a value
+MAX_SCRIPT_BYTES = 1024 * 1024  # Larger files aren't inspected
+COMMENT_LINE = r"(?m)^[ \t]*#.*$"  # Shell, Python, Perl, Ruby
+MAX_CACHED_SCRIPTS = 256
+
+# Sensitive files named in a MultiEdit or Grep block reason
+MAX_LISTED_PATHS = 5
+
+# Per-session decision cache
+STATE_DIR_ENV = "AJBM_HOOK_STATE_DIR"
+CACHE_FILE = "smart-guard-cache.json"
+CACHE_FORMAT = 4  # Bump when the cache file layout changes
+MAX_CACHE_ENTRIES = 512
+MAX_CACHED_KEY_LENGTH = 1024  # Longer tool calls (huge commands) are evaluated every time
+MAX_CACHED_PATHS = 1024
+MAX_SENSITIVE_INODES = 256
+
+# Workspace sensitive-file index (guards Grep)
+INDEX_DIR = "workspaces"
+MAX_INDEX_DIRS = 20000  # Walks stop here; content Greps over the rest are blocked
+INDEX_TIME_BUDGET = 0.3  # Seconds per call for walking and refreshing; later calls continue
+SKIP_DIRS = {
+    ".git", "node_modules", "__pycache__", ".venv", "venv", ".tox",
+    ".mypy_cache", ".pytest_cache", ".ruff_cache",
+}
+
+# Tools whose decisions depend on more than the paths they name
+UNCACHED_TOOLS = {"Grep"}
+
+# Policy layers, lowest precedence first. The project layer can only add rules;
+# only the user layer may disable or redefine rules from lower layers.
+USER_POLICY = "~/.claude/smart-guard.json"
+PROJECT_POLICY = ".claude/smart-guard.json"
+POLICY_BUNDLE_DIR = "policy"
+MAX_POLICY_BUNDLES = 16
+RULE_NAME = r"[A-Za-z_][A-Za-z0-9_]*"
+PATH_RULE_KINDS = {"name", "family", "ext", "dir", "path", "regex"}
+
+# Decision audit log (JSON lines, rotated by size)
+AUDIT_FILE = "smart-guard-audit.jsonl"
+MAX_AUDIT_BYTES = 5 * 1024 * 1024
+AUDIT_BACKUPS = 3  # Rotated files kept: .1 (newest) ... .3
+
+# Secrets in the home directory whose inodes are recorded to catch hard links
+HOME_SECRETS = [".ssh", ".gnupg", ".aws/credentials", ".kube/config", ".netrc", ".npmrc", ".pypirc"]
+
+
+def rules_source(rules: dict[str, str]) -> str:
+    """
+    Join a rule table into a single alternation.
+    Each rule becomes a named group, so match.lastgroup names the rule that fired.
+    """
+    return "|".join(f"(?P<{name}>{pattern})" for name, pattern in rules.items())
+
+
+def compile_rules(rules: dict[str, str]) -> re.Pattern | None:
+    """Compile a rule table into one case-insensitive pattern (None when empty)."""
+    return re.compile(rules_source(rules), re.IGNORECASE) if rules else None
+
+
+class PathRuleIndex(NamedTuple):
+    """Sensitive-path rules compiled into lookup tables keyed by path component."""
+
+    names: dict[str, str]  # File name -> rule
+    families: dict[str, str]  # File name stem -> rule
+    suffixes: dict[str, str]  # Extension -> rule
+    dirs: dict[str, str]  # Any component -> rule
+    trie: dict[str, Any]  # Component trie for multi-component paths
+
+
+def compile_path_rules(rules: dict[str, tuple[str, tuple[str, ...]]]) -> PathRuleIndex:
+    """
+    Compile sensitive-path rules into hash tables and a component trie.
+    Trie nodes are {"children": {component: node}, "prefixes": {prefix: rule}},
+    where prefixes match the final component of a path rule.
+    """
+    index = PathRuleIndex({}, {}, {}, {}, {"children": {}, "prefixes": {}})
+    tables = {
+        "name": index.names, "family": index.families, "ext": index.suffixes, "dir": index.dirs,
+    }
+    for rule, (kind, values) in rules.items():
+        for value in values:
+            value = value.lower()
+            if kind in tables:
+                tables[kind][value] = rule
+                continue
+            *parents, last = value.split("/")
+            node = index.trie
+            for component in parents:
+                node = node["children"].setdefault(component, {"children": {}, "prefixes": {}})
+            node["prefixes"][last] = rule
+    return index
+
+
+def match_path_rules(index: PathRuleIndex, path: str) -> str | None:
+    """Match a path in time proportional to its component count."""
+    components = [c for c in path.lower().split("/") if c]
+    if not components:
+        return None
+
+    # File-name rules don't apply to an explicit directory ("x/.env/")
+    name = "" if path.endswith("/") else components[-1]
+    rule = index.names.get(name) or index.families.get(name)
+    if rule:
+        return rule
+    dot = name.find(".", 1)
+    while dot != -1:
+        rule = index.families.get(name[:dot]) or index.suffixes.get(name[dot:])
+        if rule:
+            return rule
+        dot = name.find(".", dot + 1)
+    if name.startswith("."):
+        # A dotfile name is itself an extension (".pem")
+        rule = index.suffixes.get(name)
+        if rule:
+            return rule
+
+    for i, component in enumerate(components):
+        rule = index.dirs.get(component)
+        if rule:
+            return rule
+        node = index.trie
+        for child in components[i:]:
+            for prefix, rule in node["prefixes"].items():
+                if child.startswith(prefix):
+                    return rule
+            node = node["children"].get(child)
+            if node is None:
+                break
+    return None
+
+
+# Checksum of the built-in rule tables; part of every policy version. The tables
+# only change along with this file, so CRC-32 tells versions apart without hashlib
+BUILTIN_TABLES = json.dumps(
+    [CACHE_FORMAT, SENSITIVE_FILES, DANGEROUS_COMMANDS, sorted(FILE_READERS),
+     sorted(SCRIPT_READERS), READER_OPTIONS, {k: sorted(v) for k, v in COMMAND_PREFIXES.items()},
+     sorted(SHELLS), sorted(SHELL_KEYWORDS), sorted(SHELL_HEADERS), HOME_SECRETS, RM_TARGET_RULES,
+     sorted(SCRIPT_INTERPRETERS), sorted(INTERPRETER_OPTIONS)],
+    sort_keys=True,
+)
+BUILTIN_DIGEST = f"{zlib.crc32(BUILTIN_TABLES.encode()):08x}"
+
+
+class Policy(NamedTuple):
+    """Compiled rules from all layers, ready for matching."""
+
+    version: str  # Stamped on cached state; changes with any layer
+    path_index: PathRuleIndex
+    sensitive_regex: str  # Source of "regex" kind sensitive-file rules ("" = none)
+    dangerous: str  # Source of the dangerous-command alternation ("" = none)
+    layers: dict[str, str]  # Rule -> layer that defined it
+
+
+def read_policy_layers(cwd: str) -> list[tuple[str, bytes]]:
+    """Return (layer, raw JSON) for the user and project policy files that exist."""
+    layers = []
+    candidates = [("user", os.path.expanduser(USER_POLICY))]
+    if cwd:
+        candidates.append(("project", os.path.join(cwd, PROJECT_POLICY)))
+    for layer, path in candidates:
+        try:
+            with open(path, "rb") as f:
+                layers.append((layer, f.read()))
+        except OSError:
+            continue
+    return layers
+
+
+def valid_regex(pattern: Any) -> bool:
+    """
+    Accept policy regexes that compile as they run: inside a named group of a
+    case-insensitive alternation. So global flags like (?i) mid-pattern and
+    named groups of their own are rejected.
+    """
+    if not isinstance(pattern, str) or "(?P<" in pattern:
+        return False
+    try:
+        re.compile(rules_source({"rule": f"(?:{pattern})"}), re.IGNORECASE)
+    except (re.error, RecursionError, OverflowError):
+        return False
+    return True
+
+
+def merge_policy_layers(
+    layers: list[tuple[str, bytes]],
+) -> tuple[dict[str, tuple[str, tuple[str, ...]]], dict[str, str], dict[str, str]]:
+    """
+    Merge policy files over the built-in tables.
+    Policy file format (all keys optional):
+        {"sensitive_files": {"rule": [kind, [values...]]},
+         "dangerous_commands": {"rule": "regex"},
+         "disable": ["rule"]}
+    Invalid files and rules are skipped rather than failing the hook.
+    Returns (sensitive files, dangerous commands, rule -> layer).
+    """
+    sensitive = dict(SENSITIVE_FILES)
+    dangerous = dict(DANGEROUS_COMMANDS)
+    rule_layers = dict.fromkeys([*sensitive, *dangerous], "builtin")
+
+    for layer, raw in layers:
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            continue
+        if not isinstance(data, dict):
+            continue
+        can_override = layer == "user"
+
+        if can_override:
+            for name in data.get("disable") or []:
+                sensitive.pop(name, None)
+                dangerous.pop(name, None)
+                rule_layers.pop(name, None)
+
+        for name, spec in (data.get("sensitive_files") or {}).items():
+            if not re.fullmatch(RULE_NAME, name) or (name in rule_layers and not can_override):
+                continue
+            if not (isinstance(spec, list) and len(spec) == 2 and spec[0] in PATH_RULE_KINDS):
+                continue
+            kind, values = spec
+            if not isinstance(values, list) or not all(isinstance(v, str) and v for v in values):
+                continue
+            if kind == "regex" and not all(valid_regex(v) for v in values):
+                continue
+            dangerous.pop(name, None)
+            sensitive[name] = (kind, tuple(values))
+            rule_layers[name] = layer
+
+        for name, pattern in (data.get("dangerous_commands") or {}).items():
+            if not re.fullmatch(RULE_NAME, name) or (name in rule_layers and not can_override):
+                continue
+            if not valid_regex(pattern):
+                continue
+            sensitive.pop(name, None)
+            dangerous[name] = pattern
+            rule_layers[name] = layer
+
+    return sensitive, dangerous, rule_layers
+
+
+def bundle_compiles(bundle: dict[str, Any]) -> bool:
+    """Whether a bundle's combined regexes compile (re caches them for matching)."""
+    try:
+        for source in (bundle["sensitive_regex"], bundle["dangerous"]):
+            if source:
+                re.compile(source, re.IGNORECASE)
+    except (re.error, RecursionError, OverflowError):
+        return False
+    return True
+
+
+def build_policy_bundle(layers: list[tuple[str, bytes]]) -> dict[str, Any]:
+    """
+    Merge layers into a bundle whose combined regexes are known to compile.
+    If rules that pass validation one by one still break the alternation, the
+    layers that fail on their own are dropped (else the last one), so a bad
+    policy file never takes the built-in rules down with it.
+    """
+    bundle = merge_into_bundle(layers)
+    if layers and not bundle_compiles(bundle):
+        usable = [layer for layer in layers if bundle_compiles(merge_into_bundle([layer]))]
+        return build_policy_bundle(usable if usable != layers else layers[:-1])
+    return bundle
+
+
+def merge_into_bundle(layers: list[tuple[str, bytes]]) -> dict[str, Any]:
+    """Merge layers and precompile everything that can be serialized."""
+    sensitive, dangerous, rule_layers = merge_policy_layers(layers)
+    structural = {name: spec for name, spec in sensitive.items() if spec[0] != "regex"}
+    regexes = {
+        name: "|".join(f"(?:{v})" for v in spec[1])
+        for name, spec in sensitive.items()
+        if spec[0] == "regex"
+    }
+    return {
+        "path_index": tuple(compile_path_rules(structural)),
+        "sensitive_regex": rules_source(regexes),
+        "dangerous": rules_source(dangerous),
+        "layers": rule_layers,
+    }
+
+
+def policy_from_bundle(version: str, bundle: dict[str, Any]) -> Policy:
+    """
+    Turn a bundle into a Policy. The combined regexes stay as source and are
+    compiled on first use (re caches them), so a Read never compiles the
+    dangerous-command alternation.
+    """
+    return Policy(
+        version,
+        PathRuleIndex(*bundle["path_index"]),
+        bundle["sensitive_regex"],
+        bundle["dangerous"],
+        bundle["layers"],
+    )
+
+
+def load_policy(cwd: str) -> Policy:
+    """
+    Load the layered policy for a workspace.
+    The merged, precompiled policy is cached as a marshal bundle keyed by the
+    hashes of the built-in tables and every policy file, so unchanged policies
+    skip merging, validation and trie building on startup. Bundles are only
+    trusted from a private state dir; otherwise the policy is built each call.
+    """
+    import marshal
+
+    layers = read_policy_layers(cwd)
+    # marshal is version specific; policy files need a collision-resistant hash
+    version = f"{BUILTIN_DIGEST}-py{sys.version_info[0]}{sys.version_info[1]}"
+    if layers:
+        import hashlib
+
+        digest = hashlib.sha256(version.encode())
+        for layer, raw in layers:
+            digest.update(layer.encode() + b"\0" + hashlib.sha256(raw).digest())
+        version = digest.hexdigest()[:16]
+
+    state = private_state_dir()
+    if state is None:
+        return policy_from_bundle(version, build_policy_bundle(layers))
+    bundle_dir = os.path.join(state, POLICY_BUNDLE_DIR)
+    path = os.path.join(bundle_dir, f"{version}.bundle")
+    try:
+        with open(path, "rb") as f:
+            return policy_from_bundle(version, marshal.load(f))
+    except (OSError, ValueError, EOFError, TypeError, KeyError):
+        pass
+
+    bundle = build_policy_bundle(layers)
+    try:
+        os.makedirs(bundle_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            marshal.dump(bundle, f)
+        os.replace(tmp_path, path)
+        # Keep only the most recent bundles
+        bundles = [os.path.join(bundle_dir, n) for n in os.listdir(bundle_dir)]
+        bundles = sorted((b for b in bundles if b.endswith(".bundle")), key=os.path.getmtime)
+        for old in bundles[:-MAX_POLICY_BUNDLES]:
+            os.unlink(old)
+    except OSError:
+        pass
+    return policy_from_bundle(version, bundle)
+
+
+_active_policy: Policy | None = None
+
+
+def activate_policy(policy: Policy) -> None:
+    """Make policy the one used by all matchers in this process."""
+    global _active_policy
+    _active_policy = policy
+
+
+def current_policy() -> Policy:
+    """Return the active policy; built-in rules only until one is activated."""
+    if _active_policy is None:
+        activate_policy(policy_from_bundle(BUILTIN_DIGEST[:16], build_policy_bundle([])))
+    return _active_policy
+
+
+def match_sensitive_file(path: str) -> str | None:
+    """Return the name of the sensitive-file rule matching path, if any."""
+    if not path:
+        return None
+    policy = current_policy()
+    rule = match_path_rules(policy.path_index, path)
+    if rule is None and policy.sensitive_regex:
+        match = re.compile(policy.sensitive_regex, re.IGNORECASE).search(path)
+        rule = match.lastgroup if match else None
+    return rule
+
+
+def match_dangerous_pattern(text: str) -> str | None:
+    """Return the name of the dangerous-command regex rule found in text, if any."""
+    dangerous = current_policy().dangerous
+    match = re.compile(dangerous, re.IGNORECASE).search(text) if dangerous and text else None
+    return match.lastgroup if match else None
+
+
+def match_dangerous_command(command: str) -> str | None:
+    """Return the name of the dangerous-command rule matching command, if any."""
+    if not command:
+        return None
+    return match_dangerous_pattern(command) or dangerous_rm_rule(command)
 
 
 def is_sensitive_file(path: str) -> bool:
     """Check if a file path is sensitive."""
-    if not path:
-        return False
-    return any(re.search(pattern, path, re.IGNORECASE) for pattern in SENSITIVE_FILES)
+    return match_sensitive_file(path) is not None
 
 
 def is_dangerous_command(command: str) -> bool:
     """Check if a bash command is dangerous."""
-    if not command:
-        return False
-    return any(
-        re.search(pattern, command, re.IGNORECASE) for pattern in DANGEROUS_COMMANDS
-    )
+    return match_dangerous_command(command) is not None
 
 
-def check_bash_for_sensitive_read(command: str) -> bool:
-    """Check if bash command tries to read sensitive files."""
-    # Look for commands that read files
-    read_patterns = [
-        r"\bcat\s+([^\s;|&>]+)",  # cat filename (no pipes/redirects)
-        r"\bless\s+([^\s;|&>]+)",  # less filename
-        r"\bmore\s+([^\s;|&>]+)",  # more filename
-        r"\bhead\s+(?:-\w+\s+)*([^\s;|&>]+)",  # head with optional flags
-        r"\btail\s+(?:-\w+\s+)*([^\s;|&>]+)",  # tail with optional flags
-        r"\bgrep\s+(?:-\w+\s+)*\w+\s+([^\s;|&>]+)",  # grep pattern filename
-        r"\bawk\s+.*\s+([^\s;|&>]+)$",  # awk script filename
-        r"\bsed\s+.*\s+([^\s;|&>]+)$",  # sed command filename
-    ]
+def file_identity(path: str, content: bool = False) -> list[int] | None:
+    """
+    Return [st_dev, st_ino] of the file path points to, or None if missing.
+    With content, [st_dev, st_ino, st_size, st_mtime_ns] also tracks edits in place.
+    """
+    try:
+        st = os.stat(path)
+    except (OSError, ValueError):
+        return None
+    return [st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns] if content else [st.st_dev, st.st_ino]
+
+
+class PathResolver:
+    """
+    Canonicalizes paths (expanduser, normpath, realpath) before matching, so
+    symlinks and ./x/../ tricks can't hide a sensitive target.
+    Resolutions are cached by the target's inode identity, so a cached
+    realpath is reused after a single stat. Inodes of sensitive files are
+    remembered, catching hard links to them under any name.
+    """
+
+    def __init__(self, cwd: str = ""):
+        self.cwd = cwd
+        self.paths: dict[str, list] = {}  # Absolute path -> [realpath, st_dev, st_ino]
+        self.sensitive_inodes: dict[str, str] = {}  # "dev:ino" -> rule
+        self.seeded = False
+        # Absolute path -> [dev, ino, size, mtime_ns, sha256, rule, nested scripts]
+        self.scripts: dict[str, list] = {}
+        self.deps: dict[str, list[int] | None] = {}  # Identities the current evaluation used
+        self.changed = False
+
+    def absolute(self, path: str) -> str:
+        """Expand ~ and make path absolute and normalized (no realpath)."""
+        path = os.path.expanduser(path)
+        if self.cwd and not os.path.isabs(path):
+            path = os.path.join(self.cwd, path)
+        return os.path.normpath(path)
+
+    def resolve(self, path: str) -> tuple[str, str, list[int] | None]:
+        """Return (absolute path, realpath, identity) using the stat cache."""
+        absolute = self.absolute(path)
+        identity = file_identity(absolute)
+        self.deps[absolute] = identity
+        cached = self.paths.get(absolute)
+        if identity and cached and cached[1:] == identity:
+            return absolute, cached[0], identity
+
+        real = os.path.realpath(absolute)
+        if identity:
+            self.paths.pop(absolute, None)
+            self.paths[absolute] = [real, *identity]
+            while len(self.paths) > MAX_CACHED_PATHS:
+                del self.paths[next(iter(self.paths))]
+            self.changed = True
+        return absolute, real, identity
+
+    def match(self, path: str) -> str | None:
+        """Return the sensitive-file rule matching path in any canonical form."""
+        if not path:
+            return None
+        absolute, real, identity = self.resolve(path)
+        rule = match_sensitive_file(absolute) or match_sensitive_file(real)
+        inode = f"{identity[0]}:{identity[1]}" if identity else None
+        if not rule:
+            # Hard link to a file already known to be sensitive
+            return self.sensitive_inodes.get(inode) if inode else None
+        full = len(self.sensitive_inodes) >= MAX_SENSITIVE_INODES
+        if inode and inode not in self.sensitive_inodes and not full:
+            self.sensitive_inodes[inode] = rule
+            self.changed = True
+        return rule
+
+    def seed_home_secrets(self) -> None:
+        """Record inodes of well-known secrets in the home directory, once per session."""
+        if self.seeded:
+            return
+        self.seeded = self.changed = True
+        home = os.path.expanduser("~")
+        for relative in HOME_SECRETS:
+            path = os.path.join(home, relative)
+            if os.path.isdir(path):
+                try:
+                    names = sorted(os.listdir(path))[:MAX_SENSITIVE_INODES]
+                except OSError:
+                    continue
+                for name in names:
+                    self.match(os.path.join(path, name))
+            else:
+                self.match(path)
+
+
+def quoted_substitutions(command: str) -> list[str]:
+    """
+    Return the commands of $(...) and `...` substitutions inside double quotes.
+    shlex keeps a double-quoted word whole ("$(cat .env)"), so these are split
+    separately; unquoted substitutions are split along with the command.
+    """
+    quote_event, paren_event = re.compile(QUOTE_EVENT), re.compile(PAREN_EVENT)
+    found = []
+    quote = ""
+    pos = 0
+    while True:
+        event = quote_event.search(command, pos)
+        if event is None:
+            return found
+        token, pos = event.group(), event.end()
+        if quote == "'":
+            # Nothing is special inside single quotes, not even a backslash
+            if token == "'":
+                quote = ""
+            elif token[0] == "\\":
+                pos = event.start() + 1
+        elif token[0] == "\\":
+            continue
+        elif token in "\"'":
+            quote = "" if quote == token else quote or token
+        elif quote == '"' and token == "`":
+            end = command.find("`", pos)
+            end = len(command) if end == -1 else end
+            found.append(command[pos:end])
+            pos = end + 1
+        elif quote == '"':
+            depth, end = 1, len(command)
+            for paren in paren_event.finditer(command, pos):
+                depth += {"(": 1, ")": -1}.get(paren.group(), 0)
+                if depth == 0:
+                    end = paren.start()
+                    break
+            found.append(command[pos:end])
+            pos = end + 1
+
+
+@functools.lru_cache(maxsize=32)
+def split_simple_commands(command: str) -> tuple[tuple[str, ...], ...]:
+    """
+    Tokenize a shell command and split it into simple commands.
+    Pipelines, ;/&&/|| chains, subshells, $(...) and backticks all separate
+    commands, quoted or not. Input redirections are kept as ("<", target) token pairs.
+    Cached: the dangerous-command and sensitive-read checks split the same command.
+    """
+    quoted = []
+    if '"' in command and ("$(" in command or "`" in command):
+        quoted = quoted_substitutions(command)
+
+    # Command substitutions and line breaks start new commands
+    import shlex
 
-    for pattern in read_patterns:
-        match = re.search(pattern, command)
-        if match:
-            file_path = match.group(1).strip()
-            # Remove quotes and check
-            file_path = file_path.strip("\"'")
-            if is_sensitive_file(file_path):
-                return True
+    for start, marker in SUBSTITUTION_MARKERS.items():
+        command = command.replace(start, marker)
+    command = command.replace("\n", "\n ; ")
+    runs: list[str] = []
+
+    def stash(match: re.Match) -> str:
+        runs.append(match.group())
+        return f"\ue000{len(runs) - 1}\ue001"
+
+    command = re.sub(MID_WORD_HASH, "\ue002", re.sub(LONG_LITERAL_RUN, stash, command))
+    try:
+        lexer = shlex.shlex(command, posix=True, punctuation_chars=True)
+        lexer.whitespace_split = True
+        tokens = list(lexer)
+    except ValueError:
+        # Unbalanced quotes: fall back to plain whitespace splitting
+        tokens = command.split()
+    if runs:
+        tokens = [
+            re.sub(PLACEHOLDER, lambda m: runs[int(m.group(1))], t) if "\ue000" in t else t
+            for t in tokens
+        ]
+    tokens = [t.replace("\ue002", "#") for t in tokens]
+    for start, marker in SUBSTITUTION_MARKERS.items():
+        tokens = [t.replace(marker, start) if marker in t else t for t in tokens]
+
+    commands: list[tuple[str, ...]] = []
+    current: list[str] = []
+    skip_next = False
+    for i, token in enumerate(tokens):
+        if skip_next:
+            skip_next = False
+            continue
+        if token in ("\ue003", "\ue004"):
+            token = ";"  # Unquoted $( or `
+        if token and all(ch in SHELL_PUNCTUATION for ch in token):
+            if "(" in token or ")" in token or not ("<" in token or ">" in token):
+                # Command separator (;, &&, ||, |, &, subshells, process substitution)
+                if current:
+                    commands.append(tuple(current))
+                current = []
+            elif token in ("<", "<>"):
+                # Input redirection reads its target
+                current.extend(("<", tokens[i + 1] if i + 1 < len(tokens) else ""))
+                skip_next = True
+            else:
+                # Output redirection, fd duplication or heredoc: target isn't read
+                skip_next = True
+            continue
+        if token.isdigit() and i + 1 < len(tokens) and tokens[i + 1][:1] in "<>":
+            # File descriptor number of a redirection (2>&1)
+            continue
+        current.append(token)
+    if current:
+        commands.append(tuple(current))
+    for substitution in quoted:
+        commands.extend(split_simple_commands(substitution))
+    return tuple(commands)
+
+
+def takes_value(arg: str, options: set[str]) -> bool:
+    """Whether an option token is one of options and its value is the next token."""
+    if arg.startswith("--"):
+        name, equals, _ = arg.partition("=")
+        return name in options and not equals
+    # Short options may be bundled (-Eu root); a value-taking one ends the bundle
+    for i, letter in enumerate(arg[1:], 1):
+        if f"-{letter}" in options:
+            return i == len(arg) - 1
     return False
 
 
-def main() -> int:
+def strip_command_prefixes(args: list[str]) -> list[str]:
+    """
+    Skip reserved words, environment assignments and wrappers such as sudo or
+    env (with their options). for/case/select headers have no command at all.
+    """
+    while args and (
+        args[0] in COMMAND_PREFIXES or args[0] in SHELL_KEYWORDS or "=" in args[0][1:]
+    ):
+        prefix, args = args[0], args[1:]
+        if prefix not in COMMAND_PREFIXES:
+            continue  # Reserved word or environment assignment
+        options = COMMAND_PREFIXES[prefix]
+        while args and args[0].startswith("-") and args[0] != "-":
+            option, args = args[0], args[1:]
+            if option == "--":
+                break
+            value = ""
+            if takes_value(option, options) and args:
+                value, args = args[0], args[1:]
+            name = option.partition("=")[0] if option.startswith("--") else option[:2]
+            if prefix == "env" and name in ENV_SPLIT_OPTIONS:
+                # env -S "cat .env": the value is split into the command
+                attached = option.partition("=")[2] if option.startswith("--") else option[2:]
+                args = (value or attached).split() + args
+                break
+        args = args[PREFIX_OPERANDS.get(prefix, 0):]
+    if args and args[0] in SHELL_HEADERS:
+        return []
+    return args
+
+
+def dangerous_rm_rule(command: str, depth: int = 0) -> str | None:
+    """
+    Shell-aware check for recursive rm of /, ~, .., or everything in a directory.
+    Catches what the regexes can't: reordered or split flags (-fr, -r -f,
+    --recursive), quoting ("/", r''m), paths to the binary and sh -c nesting.
+    Returns the matching rule unless a policy disabled it.
+    """
+    for tokens in split_simple_commands(command):
+        args = strip_command_prefixes([t for t in tokens if t != "<"])
+        if not args:
+            continue
+        name = args[0].rsplit("/", 1)[-1]
+        if name in SHELLS and "-c" in args[1:-1] and depth < MAX_NESTED_SHELL_DEPTH:
+            rule = dangerous_rm_rule(args[args.index("-c") + 1], depth + 1)
+            if rule:
+                return rule
+            continue
+        if name != "rm":
+            continue
+
+        recursive = False
+        targets = []
+        options_done = False
+        for arg in args[1:]:
+            if arg == "--" and not options_done:
+                options_done = True
+            elif arg.startswith("--") and not options_done:
+                recursive = recursive or arg == "--recursive"
+            elif arg.startswith("-") and len(arg) > 1 and not options_done:
+                recursive = recursive or "r" in arg.lower()
+            else:
+                targets.append(arg)
+        if not recursive:
+            continue
+
+        for target in targets:
+            target = target[:-2] or "/" if target.endswith("/*") else target
+            target = target.rstrip("/") or "/"
+            rule = RM_TARGET_RULES.get(target)
+            if rule and rule in current_policy().layers:
+                return rule
+    return None
+
+
+def reader_operands(args: list[str], name: str) -> list[str]:
+    """Return the file operands of a known file-reading command."""
+    options = READER_OPTIONS.get(name, {})
+    operands: list[str] = []
+    script_given = False
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        i += 1
+        if arg == "--":
+            operands.extend(args[i:])
+            break
+        if not arg.startswith("-") or arg == "-":
+            operands.append(arg)
+            continue
+        option, _, value = arg.partition("=")
+        kind = options.get(option)
+        if kind is None:
+            continue
+        if not value and i < len(args):
+            value = args[i]
+            i += 1
+        if kind == "file":
+            # Script or pattern read from a file
+            script_given = True
+            operands.append(value)
+        elif kind == "script":
+            script_given = True
+
+    if name in SCRIPT_READERS and not script_given and operands:
+        # First operand is the pattern or script
+        operands = operands[1:]
+    return operands
+
+
+def bash_read_operands(command: str, depth: int = 0) -> list[str]:
+    """
+    Collect every file operand read by the command: operands of known readers
+    (cat, head, grep, sed, ...) and input redirections, in all simple commands,
+    including those nested in sh -c / bash -c / eval.
+    """
+    operands: list[str] = []
+    for tokens in split_simple_commands(command):
+        args = []
+        for i, token in enumerate(tokens):
+            if token == "<" and i + 1 < len(tokens):
+                operands.append(tokens[i + 1])
+            elif i == 0 or tokens[i - 1] != "<":
+                args.append(token)
+
+        args = strip_command_prefixes(args)
+        if not args:
+            continue
+
+        name = args[0].rsplit("/", 1)[-1]
+        if name in FILE_READERS or name in SCRIPT_READERS:
+            operands.extend(reader_operands(args[1:], name))
+        elif depth < MAX_NESTED_SHELL_DEPTH:
+            if name in SHELLS and "-c" in args[1:-1]:
+                operands.extend(bash_read_operands(args[args.index("-c") + 1], depth + 1))
+            elif name == "eval":
+                operands.extend(bash_read_operands(" ".join(args[1:]), depth + 1))
+    return operands
+
+
+def match_sensitive_files(
+    paths: list[str], resolver: PathResolver | None = None
+) -> dict[str, str | None]:
+    """
+    Check a batch of paths; return a verdict (rule or None) per distinct path.
+    With a resolver, paths are canonicalized first.
+    """
+    match = resolver.match if resolver else match_sensitive_file
+    return {path: match(path) for path in dict.fromkeys(paths)}
+
+
+def check_bash_for_sensitive_read(command: str, resolver: PathResolver | None = None) -> str | None:
+    """Check if bash command tries to read sensitive files; return the rule that fired."""
+    verdicts = match_sensitive_files(bash_read_operands(command), resolver)
+    return next((rule for rule in verdicts.values() if rule), None)
+
+
+def first_operand(args: list[str]) -> str | None:
+    """Return the script operand of an interpreter's arguments (None for inline code)."""
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        i += 1
+        if arg in INLINE_CODE_OPTIONS:
+            return None
+        if arg == "--":
+            return args[i] if i < len(args) else None
+        if arg in INTERPRETER_OPTIONS:
+            i += 1
+        elif not arg.startswith(("-", "+")):
+            return arg
+    return None
+
+
+def invoked_scripts(command: str, depth: int = 0) -> list[tuple[str, bool | None]]:
+    """
+    Return (path, is shell) for every local script the command runs: bash x.sh,
+    bash < x.sh, source x.sh, python x.py or ./x. Is shell is None for scripts
+    run directly; their shebang decides.
+    """
+    scripts: list[tuple[str, bool | None]] = []
+    for tokens in split_simple_commands(command):
+        args = []
+        stdin = []
+        for i, token in enumerate(tokens):
+            if token == "<" and i + 1 < len(tokens):
+                stdin.append(tokens[i + 1])
+            elif i == 0 or tokens[i - 1] != "<":
+                args.append(token)
+
+        args = strip_command_prefixes(args)
+        if not args:
+            continue
+
+        name = args[0].rsplit("/", 1)[-1]
+        if name in SHELLS and "-c" in args[1:]:
+            if depth < MAX_NESTED_SHELL_DEPTH and "-c" in args[1:-1]:
+                scripts.extend(invoked_scripts(args[args.index("-c") + 1], depth + 1))
+        elif name in SHELLS or name in SCRIPT_INTERPRETERS or re.fullmatch(r"python\d[\d.]*", name):
+            operand = first_operand(args[1:])
+            if operand:
+                scripts.append((operand, name in SHELLS))
+            elif name in SHELLS and stdin:
+                scripts.append((stdin[0], True))
+        elif name in SOURCE_COMMANDS and len(args) > 1:
+            scripts.append((args[1], True))
+        elif name == "eval" and depth < MAX_NESTED_SHELL_DEPTH:
+            scripts.extend(invoked_scripts(" ".join(args[1:]), depth + 1))
+        elif "/" in args[0]:
+            scripts.append((args[0], None))
+    return scripts
+
+
+def shebang_is_shell(text: str) -> bool:
+    """Whether a directly executed script runs in a shell (no shebang runs in one)."""
+    first_line = text.split("\n", 1)[0]
+    if not first_line.startswith("#!"):
+        return True
+    words = first_line[2:].split()
+    if not words:
+        return True
+    interpreter = words[0].rsplit("/", 1)[-1]
+    if interpreter == "env":
+        interpreter = next((w for w in words[1:] if not w.startswith("-")), "")
+    return interpreter in SHELLS
+
+
+def inspect_script(
+    absolute: str, is_shell: bool | None, identity: list[int], resolver: PathResolver
+) -> list | None:
+    """
+    Read a script and store its cache entry [*identity, sha256, rule, nested].
+    A script whose content hash is unchanged (touched, checked out again)
+    keeps its verdict without being scanned.
+    """
     try:
-        data: dict[str, Any] = json.load(sys.stdin)
-    except Exception:
-        # If stdin isn't JSON, allow operation
-        return 0
+        with open(absolute, "rb") as f:
+            data = f.read(MAX_SCRIPT_BYTES + 1)
+    except OSError:
+        return None
+    if len(data) > MAX_SCRIPT_BYTES:
+        return None
 
-    tool_name = data.get("tool_name", "")
-    tool_input = data.get("tool_input", {})
+    import hashlib
+
+    digest = hashlib.sha256(data).hexdigest()
+    previous = resolver.scripts.pop(absolute, None)
+    if previous and previous[4] == digest:
+        rule, nested = previous[5], previous[6]
+    elif b"\0" in data[:8192]:
+        # Binary executable, nothing to scan
+        rule, nested = None, []
+    else:
+        text = data.decode("utf-8", "replace")
+        if is_shell is None:
+            is_shell = shebang_is_shell(text)
+        text = re.sub(COMMENT_LINE, "", text)
+        if is_shell:
+            rule = match_dangerous_command(text) or check_bash_for_sensitive_read(text, resolver)
+            nested = [list(script) for script in invoked_scripts(text)]
+        else:
+            # Other languages: only the dangerous-command patterns apply (os.system("rm -rf ~"))
+            rule, nested = match_dangerous_pattern(text), []
+
+    entry = [*identity, digest, rule, nested]
+    resolver.scripts[absolute] = entry
+    while len(resolver.scripts) > MAX_CACHED_SCRIPTS:
+        del resolver.scripts[next(iter(resolver.scripts))]
+    resolver.changed = True
+    return entry
+
+
+def script_rule(
+    path: str, is_shell: bool | None, resolver: PathResolver, depth: int = 0
+) -> str | None:
+    """
+    Return the rule tripped by the contents of a script the command runs,
+    including scripts it runs in turn. Verdicts are cached per path against
+    (inode, size, mtime), so an unchanged script costs a single stat.
+    """
+    absolute = resolver.absolute(path)
+    try:
+        st = os.stat(absolute)
+    except (OSError, ValueError):
+        resolver.deps[absolute] = None
+        return None
+    identity = [st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns]
+    if not stat.S_ISREG(st.st_mode) or st.st_size > MAX_SCRIPT_BYTES:
+        resolver.deps[absolute] = identity
+        return None
+
+    entry = resolver.scripts.get(absolute)
+    if entry is None or entry[:4] != identity:
+        entry = inspect_script(absolute, is_shell, identity, resolver)
+    # Recorded last: the scan may have resolved this path as a plain read
+    resolver.deps[absolute] = identity
+    if entry is None:
+        return None
+
+    rule, nested = entry[5], entry[6]
+    if rule or depth >= MAX_NESTED_SHELL_DEPTH:
+        return rule
+    for nested_path, nested_shell in nested:
+        rule = script_rule(nested_path, nested_shell, resolver, depth + 1)
+        if rule:
+            return rule
+    return None
+
+
+def scan_directory(root: str, rel_dir: str, index: dict[str, Any]) -> list[str]:
+    """
+    Record one directory's mtime and sensitive files in the index.
+    Returns its subdirectories (relative paths) that still need scanning.
+    """
+    full = os.path.join(root, rel_dir) if rel_dir else root
+    try:
+        index["dirs"][rel_dir] = os.stat(full).st_mtime_ns
+        entries = list(os.scandir(full))
+    except OSError:
+        index["dirs"].pop(rel_dir, None)
+        return []
+
+    subdirs = []
+    for entry in entries:
+        rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+        try:
+            is_dir = entry.is_dir(follow_symlinks=False)
+        except OSError:
+            continue
+        if is_dir:
+            if entry.name not in SKIP_DIRS:
+                subdirs.append(rel)
+            continue
+        rule = match_sensitive_file(rel)
+        if rule:
+            index["files"][rel] = rule
+    return subdirs
+
+
+def walk_into_index(
+    root: str, rel_dirs: list[str], index: dict[str, Any], deadline: float
+) -> None:
+    """
+    Scan directories and everything below them, up to MAX_INDEX_DIRS or the
+    deadline (a time.perf_counter() value). Directories left unscanned are
+    kept in index["pending"] for a later call to continue.
+    """
+    pending = list(rel_dirs)
+    while pending:
+        if len(index["dirs"]) >= MAX_INDEX_DIRS or time.perf_counter() >= deadline:
+            index["pending"].extend(pending)
+            return
+        pending.extend(scan_directory(root, pending.pop(), index))
+
+
+def in_scope(rel: str, scope: str) -> bool:
+    """Whether a relative path is the scope directory or below it ("" is the root)."""
+    return not scope or rel == scope or rel.startswith(scope + "/")
+
+
+def refresh_index(
+    root: str, index: dict[str, Any], scope: str, deadline: float
+) -> tuple[bool, bool]:
+    """
+    Bring the scope of the index up to date by comparing directory mtimes.
+    Costs one stat per indexed directory in scope; only directories whose
+    entries changed are rescanned. A truncated walk is continued first, so
+    it keeps progressing even when the stats alone use up the time.
+    Returns (changed, complete): complete is False if the deadline passed
+    before every directory in scope was checked.
+    """
+    indexed = list(index["dirs"].items())
+    changed = False
+    # Resume a truncated walk while there is room under the limit
+    if index["pending"] and len(index["dirs"]) < MAX_INDEX_DIRS:
+        pending, index["pending"] = index["pending"], []
+        walk_into_index(root, pending, index, deadline)
+        changed = True
+
+    for rel_dir, mtime in indexed:
+        if rel_dir not in index["dirs"] or not in_scope(rel_dir, scope):
+            continue  # Removed along with a parent below, or outside the search
+        if time.perf_counter() >= deadline:
+            return changed, False
+        full = os.path.join(root, rel_dir) if rel_dir else root
+        try:
+            current = os.stat(full).st_mtime_ns
+        except OSError:
+            current = None
+        if current == mtime:
+            continue
+
+        changed = True
+        prefix = f"{rel_dir}/" if rel_dir else ""
+        direct = [f for f in index["files"] if f.startswith(prefix) and "/" not in f[len(prefix):]]
+        for rel in direct:
+            del index["files"][rel]
+        if current is None:
+            # Directory gone: drop it and everything below it
+            for rel in [d for d in index["dirs"] if in_scope(d, rel_dir)]:
+                del index["dirs"][rel]
+            for rel in [f for f in index["files"] if f.startswith(prefix)]:
+                del index["files"][rel]
+            index["pending"] = [d for d in index["pending"] if not in_scope(d, rel_dir)]
+            continue
+        subdirs = scan_directory(root, rel_dir, index)
+        new_dirs = [d for d in subdirs if d not in index["dirs"] and d not in index["pending"]]
+        walk_into_index(root, new_dirs, index, deadline)
+    return changed, True
+
+
+def load_workspace_index(root: str, scope: str = "") -> dict[str, Any] | None:
+    """
+    Return the sensitive-file index for a directory tree, as
+    {"dirs": {rel_dir: mtime_ns}, "files": {rel_path: rule}, "pending": [rel_dir]}.
+    Built by a walk, then refreshed within the searched scope on every call.
+    A scope outside the index (a skipped or new directory) is scanned first.
+    Each call gets INDEX_TIME_BUDGET: a walk cut short stays in "pending",
+    and None is returned if the scope couldn't be refreshed in time. Progress
+    is saved either way, so later calls continue where this one stopped.
+    """
+    import hashlib
+
+    deadline = time.perf_counter() + INDEX_TIME_BUDGET
+    state = private_state_dir()
+    index_dir = os.path.join(state or "", INDEX_DIR)
+    path = os.path.join(index_dir, f"{hashlib.sha256(root.encode()).hexdigest()[:16]}.json")
+    try:
+        if state is None:
+            raise ValueError("untrusted state dir")
+        with open(path) as f:
+            index = json.load(f)
+        if index.get("policy") != current_policy().version or index.get("root") != root:
+            raise ValueError("stale index")
+        changed, complete = refresh_index(root, index, scope, deadline)
+    except (OSError, ValueError, KeyError):
+        index = {
+            "policy": current_policy().version,
+            "root": root,
+            "dirs": {},
+            "files": {},
+            "pending": [],
+        }
+        walk_into_index(root, [""], index, deadline)
+        changed = complete = True
+
+    if scope not in index["dirs"] and not any(in_scope(scope, d) for d in index["pending"]):
+        walk_into_index(root, [scope], index, deadline)
+        changed = True
+
+    if changed and state is not None:
+        try:
+            os.makedirs(index_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(index, f, separators=(",", ":"))
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+    return index if complete else None
+
+
+def expand_braces(pattern: str) -> list[str]:
+    """Expand {a,b} alternatives in a glob (fnmatch has no brace support)."""
+    match = re.search(r"\{([^{}]*)\}", pattern)
+    if not match:
+        return [pattern]
+    head, tail = pattern[: match.start()], pattern[match.end() :]
+    return [p for option in match.group(1).split(",") for p in expand_braces(head + option + tail)]
+
+
+def sensitive_files_in_scope(
+    search_path: str, cwd: str, glob: str | None = None, file_type: str | None = None
+) -> dict[str, str] | None:
+    """
+    Return the indexed sensitive files (absolute path -> rule) a Grep over
+    search_path would read, honouring its glob (including !excludes) and type
+    filters. Returns None when part of the scope was never indexed or could
+    not be checked within the index's time budget.
+
+    The payload doesn't say which ripgrep filters the tool applies, so hidden
+    and .gitignore'd files count as searched: a .env.example or an ignored
+    .env in scope blocks a content search until a glob excludes it.
+    """
+    import fnmatch
+
+    if not os.path.isdir(search_path):
+        return {}
+    # Index the workspace once and answer sub-directory searches from it
+    inside_cwd = cwd and (search_path + os.sep).startswith(cwd.rstrip(os.sep) + os.sep)
+    root = cwd if inside_cwd else search_path
+    scope = os.path.relpath(search_path, root)
+    scope = "" if scope == "." else scope.replace(os.sep, "/")
+    index = load_workspace_index(root, scope)
+    if index is None or any(in_scope(d, scope) or in_scope(scope, d) for d in index["pending"]):
+        return None
+
+    globs = expand_braces(glob) if glob else []
+    includes = [g for g in globs if not g.startswith("!")]
+    excludes = [g[1:] for g in globs if g.startswith("!")]
+
+    found = {}
+    for rel, rule in index["files"].items():
+        if not in_scope(rel, scope):
+            continue
+        name = rel.rsplit("/", 1)[-1]
+        if file_type and os.path.splitext(name)[1] != f".{file_type}":
+            continue
+        if includes and not any(fnmatch.fnmatch(rel if "/" in g else name, g) for g in includes):
+            continue
+        if any(fnmatch.fnmatch(rel if "/" in g else name, g) for g in excludes):
+            continue
+        found[os.path.join(root, rel)] = rule
+    return found
+
+
+def block(reason: str, rule: str) -> dict[str, str]:
+    """Build a block decision naming the rule that fired and its policy layer."""
+    layer = current_policy().layers.get(rule, "builtin")
+    return {
+        "decision": "block",
+        "reason": f"{reason} (rule: {rule}, policy: {layer})",
+        "rule": rule,
+        "layer": layer,
+    }
+
+
+def listed_paths(paths: dict[str, str]) -> str:
+    """Name the first MAX_LISTED_PATHS paths of a block reason and count the rest."""
+    listed = ", ".join(list(paths)[:MAX_LISTED_PATHS])
+    more = len(paths) - MAX_LISTED_PATHS
+    return f"{listed} and {more} more" if more > 0 else listed
+
+
+def evaluate(
+    tool_name: str, tool_input: dict[str, Any], resolver: PathResolver | None = None
+) -> dict[str, str] | None:
+    """Evaluate a tool call; return a block decision or None to allow."""
+    resolver = resolver or PathResolver()
 
     # Check Bash commands
     if tool_name == "Bash":
         command = tool_input.get("command", "")
 
         # Check for dangerous commands
-        if is_dangerous_command(command):
-            print(
-                json.dumps(
-                    {
-                        "decision": "block",
-                        "reason": f"Dangerous command blocked: {command[:50]}...",
-                    }
-                )
-            )
-            return 2
+        rule = match_dangerous_command(command)
+        if rule:
+            return block(f"Dangerous command blocked: {command[:50]}...", rule)
 
         # Check for reading sensitive files
-        if check_bash_for_sensitive_read(command):
-            print(
-                json.dumps(
-                    {"decision": "block", "reason": "Command would read sensitive file"}
-                )
-            )
-            return 2
+        rule = check_bash_for_sensitive_read(command, resolver)
+        if rule:
+            return block("Command would read sensitive file", rule)
+
+        # Check local scripts the command runs
+        for path, is_shell in invoked_scripts(command):
+            rule = script_rule(path, is_shell, resolver)
+            if rule:
+                return block(f"Script would run a blocked command or read: {path}", rule)
 
     # Check Read operations
     elif tool_name == "Read":
         file_path = tool_input.get("file_path", "")
-        if is_sensitive_file(file_path):
-            print(
-                json.dumps(
-                    {
-                        "decision": "block",
-                        "reason": f"Reading sensitive file blocked: {file_path}",
-                    }
-                )
-            )
-            return 2
+        rule = resolver.match(file_path)
+        if rule:
+            return block(f"Reading sensitive file blocked: {file_path}", rule)
 
     # Check Write/Edit operations
     elif tool_name in ["Write", "Edit", "MultiEdit"]:
         # Single file operations
         file_path = tool_input.get("file_path", "")
-        if is_sensitive_file(file_path):
-            print(
-                json.dumps(
-                    {
-                        "decision": "block",
-                        "reason": f"Modifying sensitive file blocked: {file_path}",
-                    }
-                )
-            )
-            return 2
+        rule = resolver.match(file_path)
+        if rule:
+            return block(f"Modifying sensitive file blocked: {file_path}", rule)
 
-        # MultiEdit operations
+        # MultiEdit operations: one batch with a verdict per file
         if tool_name == "MultiEdit":
-            for edit in tool_input.get("edits", []):
-                if is_sensitive_file(edit.get("file_path", "")):
-                    print(
-                        json.dumps(
-                            {
-                                "decision": "block",
-                                "reason": "Modifying sensitive file blocked",
-                            }
-                        )
-                    )
-                    return 2
+            verdicts = match_sensitive_files(
+                [edit.get("file_path", "") for edit in tool_input.get("edits", [])], resolver
+            )
+            blocked = {path: rule for path, rule in verdicts.items() if rule}
+            if blocked:
+                return block(
+                    f"Modifying sensitive files blocked: {listed_paths(blocked)}",
+                    next(iter(blocked.values())),
+                )
+
+    # Check Grep searches: content output would expose sensitive files
+    elif tool_name == "Grep":
+        search_path = tool_input.get("path") or resolver.cwd or os.getcwd()
+        rule = resolver.match(search_path)
+        if rule:
+            return block(f"Searching sensitive path blocked: {search_path}", rule)
+
+        if tool_input.get("output_mode") == "content":
+            found = sensitive_files_in_scope(
+                resolver.absolute(search_path),
+                resolver.absolute(resolver.cwd) if resolver.cwd else "",
+                tool_input.get("glob"),
+                tool_input.get("type"),
+            )
+            if found is None:
+                return block(
+                    f"Grep scope is too large to check for sensitive files (over "
+                    f"{MAX_INDEX_DIRS} directories or {INDEX_TIME_BUDGET}s). Narrow the path",
+                    "grep_scope_too_large",
+                )
+            if found:
+                return block(
+                    f"Grep would show contents of sensitive files: {listed_paths(found)}. "
+                    "Narrow the path, or exclude them with a glob such as !.env*",
+                    next(iter(found.values())),
+                )
 
     # Allow all other operations
+    return None
+
+
+def state_dir() -> str:
+    """Per-user directory for hook state shared across invocations."""
+    base = os.environ.get(STATE_DIR_ENV)
+    if not base:
+        tmp = os.environ.get("TMPDIR") or os.environ.get("TEMP") or "/tmp"
+        # Per user, so other accounts sharing the temp dir can't plant state
+        name = f"ajbm-hooks-{os.getuid()}" if hasattr(os, "getuid") else "ajbm-hooks"
+        base = os.path.join(tmp, name)
+    return base
+
+
+def private_state_dir() -> str | None:
+    """
+    Return the state dir, creating it with mode 0700, if it belongs to this
+    user and no one else can write to it; None otherwise. State that decides
+    verdicts (policy bundles, session caches, Grep indexes) is only read from
+    and written to a private state dir, so another account sharing the temp
+    dir can't plant it.
+    """
+    path = state_dir()
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        info = os.lstat(path)
+    except OSError:
+        return None
+    if not stat.S_ISDIR(info.st_mode) or info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        return None
+    if hasattr(os, "getuid") and info.st_uid != os.getuid():
+        return None
+    return path
+
+
+def decision_key(tool_name: str, tool_input: dict[str, Any], cwd: str = "") -> str:
+    """
+    Serialize the parts of a tool call that evaluate() looks at.
+    Write contents and edit strings are left out: they never affect a decision.
+    """
+    if tool_name == "Bash":
+        relevant: Any = tool_input.get("command", "")
+    elif tool_name == "Grep":
+        relevant = [tool_input.get(k) for k in ("path", "glob", "type", "output_mode")]
+    elif tool_name == "MultiEdit":
+        relevant = [tool_input.get("file_path", "")]
+        relevant += [edit.get("file_path", "") for edit in tool_input.get("edits", [])]
+    else:
+        relevant = tool_input.get("file_path", "")
+    return json.dumps([tool_name, cwd, relevant], separators=(",", ":"))
+
+
+class SessionCache:
+    """
+    On-disk state for one session: an LRU of decision key -> decision
+    (None = allow) plus the PathResolver caches.
+    Cached decisions record the identity of every path they resolved and are
+    only reused while those paths still point at the same files (and scripts
+    they inspected are unmodified).
+    The file is loaded and saved under an exclusive flock on a sidecar lock
+    file and replaced atomically.
+    """
+
+    def __init__(self, session_id: str, cwd: str = ""):
+        session = "".join(c for c in session_id if c.isascii() and (c.isalnum() or c in "-_"))
+        state = private_state_dir() if session else None
+        self.path = os.path.join(state, session, CACHE_FILE) if state else None
+        self.entries: dict[str, dict[str, Any]] = {}
+        self.resolver = PathResolver(cwd)
+        self.dirty = False
+        self._lock_fd: int | None = None
+
+    def __enter__(self) -> "SessionCache":
+        if self.path is None:
+            return self
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            lock_path = os.path.splitext(self.path)[0] + ".lock"
+            self._lock_fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+            if fcntl:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            with open(self.path) as f:
+                stored = json.load(f)
+            # State from another policy version is dropped wholesale
+            if stored.get("policy") == current_policy().version:
+                self.entries = stored.get("entries", {})
+                self.resolver.paths = stored.get("paths", {})
+                self.resolver.sensitive_inodes = stored.get("sensitive_inodes", {})
+                self.resolver.seeded = stored.get("seeded", False)
+                self.resolver.scripts = stored.get("scripts", {})
+        except (OSError, ValueError, AttributeError):
+            self.entries = {}
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self.path is not None and (self.dirty or self.resolver.changed):
+            self.save()
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)  # Releases the flock
+            self._lock_fd = None
+
+    def get(self, key: str) -> tuple[bool, dict[str, str] | None]:
+        """Return (hit, decision). Hits in the older half move to the recent end."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return False, None
+        if any(
+            file_identity(path, content=identity is not None and len(identity) > 2) != identity
+            for path, identity in entry["deps"].items()
+        ):
+            # A path it depended on was created, removed, retargeted or (scripts) edited
+            return False, None
+        keys = list(self.entries)
+        if keys.index(key) < len(keys) // 2:
+            # Refresh only entries at risk of eviction; keeps hot hits read-only
+            self.entries[key] = self.entries.pop(key)
+            self.dirty = True
+        return True, entry["decision"]
+
+    def put(
+        self, key: str, decision: dict[str, str] | None, deps: dict[str, list[int] | None]
+    ) -> None:
+        """Store a decision as most recently used, evicting the oldest entries."""
+        self.entries.pop(key, None)
+        self.entries[key] = {"decision": decision, "deps": deps}
+        while len(self.entries) > MAX_CACHE_ENTRIES:
+            del self.entries[next(iter(self.entries))]
+        self.dirty = True
+
+    def save(self) -> None:
+        """Write the session state atomically."""
+        state = {
+            "policy": current_policy().version,
+            "entries": self.entries,
+            "paths": self.resolver.paths,
+            "sensitive_inodes": self.resolver.sensitive_inodes,
+            "seeded": self.resolver.seeded,
+            "scripts": self.resolver.scripts,
+        }
+        try:
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(state, f, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+
+def cached_evaluate(
+    session_id: str, tool_name: str, tool_input: dict[str, Any], cwd: str = ""
+) -> tuple[dict[str, str] | None, bool]:
+    """evaluate() behind the per-session decision cache; returns (decision, cache hit)."""
+    key = decision_key(tool_name, tool_input, cwd)
+    cacheable = tool_name not in UNCACHED_TOOLS and len(key) <= MAX_CACHED_KEY_LENGTH
+    with SessionCache(session_id, cwd) as cache:
+        hit, decision = cache.get(key) if cacheable else (False, None)
+        if not hit:
+            cache.resolver.seed_home_secrets()
+            cache.resolver.deps = {}
+            decision = evaluate(tool_name, tool_input, cache.resolver)
+            if cache.path is not None and cacheable:
+                cache.put(key, decision, cache.resolver.deps)
+    return decision, hit
+
+
+def write_audit_record(record: dict[str, Any], path: str | None = None) -> None:
+    """
+    Append one decision record with a single O_APPEND write, so concurrent
+    hooks never interleave lines. Rotates the file once it exceeds MAX_AUDIT_BYTES.
+    """
+    path = path or os.path.join(state_dir(), AUDIT_FILE)
+    line = (json.dumps(record, separators=(",", ":")) + "\n").encode()
+    try:
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            os.write(fd, line)
+            if os.fstat(fd).st_size > MAX_AUDIT_BYTES:
+                for n in range(AUDIT_BACKUPS - 1, 0, -1):
+                    if os.path.exists(f"{path}.{n}"):
+                        os.replace(f"{path}.{n}", f"{path}.{n + 1}")
+                os.replace(path, f"{path}.1")
+        finally:
+            os.close(fd)
+    except OSError:
+        pass  # Auditing never blocks a decision
+
+
+def read_audit_records(path: str) -> list[dict[str, Any]]:
+    """Read the audit log and its rotated backups, oldest first."""
+    records = []
+    for n in range(AUDIT_BACKUPS, -1, -1):
+        current = f"{path}.{n}" if n else path
+        try:
+            with open(current) as f:
+                lines = f.readlines()
+        except OSError:
+            continue
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue  # Torn or foreign line
+    return records
+
+
+def percentile(sorted_values: list[int], pct: float) -> int:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def format_audit_summary(records: list[dict[str, Any]]) -> str:
+    """Per-tool decision counts, block rates and latency percentiles."""
+    if not records:
+        return "No smart-guard decisions recorded."
+
+    by_tool: dict[str, list[dict[str, Any]]] = {}
+    for record in records:
+        by_tool.setdefault(record.get("tool", "?"), []).append(record)
+
+    lines = [
+        f"{'tool':<10} {'calls':>7} {'blocked':>8} {'rate':>7} {'cached':>7} "
+        f"{'p50 µs':>8} {'p95 µs':>8} {'p99 µs':>8}"
+    ]
+    for tool, tool_records in sorted(by_tool.items(), key=lambda item: -len(item[1])):
+        blocked = sum(1 for r in tool_records if r.get("decision") == "block")
+        cached = sum(1 for r in tool_records if r.get("cached"))
+        latencies = sorted(r.get("us", 0) for r in tool_records)
+        lines.append(
+            f"{tool:<10} {len(tool_records):>7} {blocked:>8} {blocked / len(tool_records):>7.1%} "
+            f"{cached:>7} {percentile(latencies, 50):>8} {percentile(latencies, 95):>8} "
+            f"{percentile(latencies, 99):>8}"
+        )
+
+    rules: dict[str, int] = {}
+    for record in records:
+        if record.get("rule"):
+            label = f"{record['rule']} ({record.get('layer', 'builtin')})"
+            rules[label] = rules.get(label, 0) + 1
+    if rules:
+        lines.extend(["", "Top rules:"])
+        for label, count in sorted(rules.items(), key=lambda item: -item[1])[:10]:
+            lines.append(f"  {count:>6}  {label}")
+    return "\n".join(lines)
+
+
+def main() -> int:
+    if sys.argv[1:2] == ["--audit-summary"]:
+        path = sys.argv[2] if len(sys.argv) > 2 else os.path.join(state_dir(), AUDIT_FILE)
+        print(format_audit_summary(read_audit_records(path)))
+        return 0
+
+    try:
+        data: dict[str, Any] = json.load(sys.stdin)
+    except Exception:
+        # If stdin isn't JSON, allow operation
+        return 0
+
+    started = time.perf_counter()
+    tool_name = data.get("tool_name", "")
+    tool_input = data.get("tool_input", {})
+    cwd = data.get("cwd", "")
+    activate_policy(load_policy(cwd or os.getcwd()))
+    decision, cached = cached_evaluate(data.get("session_id", ""), tool_name, tool_input, cwd)
+    elapsed_us = int((time.perf_counter() - started) * 1_000_000)
+
+    write_audit_record(
+        {
+            "ts": int(time.time()),
+            "tool": tool_name,
+            "input": f"{zlib.crc32(decision_key(tool_name, tool_input, cwd).encode()):08x}",
+            "decision": decision["decision"] if decision else "allow",
+            "rule": decision["rule"] if decision else None,
+            "layer": decision["layer"] if decision else None,
+            "cached": cached,
+            "us": elapsed_us,
+        }
+    )
+
+    if decision:
+        # The rule is only for internal use; hook output keeps the documented keys
+        print(json.dumps({"decision": decision["decision"], "reason": decision["reason"]}))
+        return 2
     return 0
 
 
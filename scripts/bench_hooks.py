@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for every plugin hook.
+
+Spawns each hook as a real subprocess, the way hooks.json does, feeding it
+representative payloads, and reports spawn-to-exit latency percentiles,
+peak RSS and the slowest imports (-X importtime). Results are compared with
+a saved baseline so a change that slows every user turn fails the run.
+
+Latency is compared relative to a bare interpreter start measured in the
+same run, so a baseline saved on one machine stays meaningful on another.
+
+Usage:
+    python scripts/bench_hooks.py                   # Benchmark, compare with baseline
+    python scripts/bench_hooks.py --save-baseline   # Benchmark, overwrite baseline
+    python scripts/bench_hooks.py --hook smart-guard --runs 100
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from build_hooks import PLUGINS_DIR, PROJECT_ROOT, hook_source, wired_hooks
+
+BASELINE_FILE = Path(__file__).resolve().parent / "hook_baselines.json"
+DEFAULT_TOLERANCE = 0.25  # Allowed growth of p50 relative to a bare interpreter
+MIN_REGRESSION_MS = 2.0  # Smaller slowdowns are noise
+TOP_IMPORTS = 8
+
+# (plugin, hook script name, event) for every hook shipped, wired or not
+HOOKS = [
+    ("development-skills", "skill-activation-prompt", "UserPromptSubmit"),
+    ("business-skills", "skill-activation-prompt", "UserPromptSubmit"),
+    ("development-skills", "error-detection-hook", "PostToolUse"),
+    ("security", "smart-guard", "PreToolUse"),
+]
+
+FAILING_PYTEST = "\n".join(
+    [f"tests/test_mod{i}.py::test_case{i} PASSED" for i in range(200)]
+    + [
+        "FAILED tests/test_api.py::test_login - AssertionError: assert 401 == 200",
+        "1 failed, 200 passed in 3.2s",
+    ]
+)
+
+# Representative payloads per event; runs cycle through them
+PAYLOADS = {
+    "UserPromptSubmit": [
+        {"prompt": "help me debug this failing test in the auth module"},
+        {"prompt": "write an x post announcing our launch and a pitch for the offer"},
+        {"prompt": "what time is it?"},
+    ],
+    "PostToolUse": [
+        {
+            "tool_name": "Bash",
+            "tool_input": {"command": "pytest -q"},
+            "tool_output": "42 passed in 1.1s",
+        },
+        {
+            "tool_name": "Bash",
+            "tool_input": {"command": "pytest -q"},
+            "tool_output": FAILING_PYTEST,
+        },
+        {
+            "tool_name": "Bash",
+            "tool_input": {"command": "npm run build"},
+            "tool_output": "x" * 200_000,
+        },
+    ],
+    "PreToolUse": [
+        {"tool_name": "Read", "tool_input": {"file_path": "README.md"}},
+        {"tool_name": "Bash", "tool_input": {"command": "git status && git diff --stat"}},
+        {"tool_name": "Bash", "tool_input": {"command": "cat .env | head"}},
+        {
+            "tool_name": "MultiEdit",
+            "tool_input": {
+                "file_path": "a.py",
+                "edits": [{"file_path": f"src/m{i}.py"} for i in range(50)],
+            },
+        },
+    ],
+}
+
+
+def hook_command(plugin: str, name: str) -> list[str]:
+    """The hooks.json command for a wired hook; a plain interpreter run otherwise."""
+    for plugin_root, _, argv in wired_hooks():
+        if plugin_root.name == plugin and hook_source(argv).stem == name:
+            return [sys.executable if arg == "python3" else arg for arg in argv]
+    return [sys.executable, str(PLUGINS_DIR / plugin / "hooks" / f"{name}.py")]
+
+
+def spawn(argv: list[str], payload: str, env: dict[str, str]) -> tuple[float, float, int]:
+    """Run argv once; return (wall ms, peak RSS MB, exit code)."""
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        argv, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env
+    )
+    try:
+        process.stdin.write(payload.encode())
+        process.stdin.close()
+    except BrokenPipeError:
+        pass  # Exited without reading all of stdin
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = (time.perf_counter() - started) * 1000
+    process.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss_mb = usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return elapsed, rss_mb, process.returncode
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def import_breakdown(argv: list[str], payload: str, env: dict[str, str]) -> list[tuple[str, int]]:
+    """Return (module, cumulative µs) of the slowest top-level imports of one run."""
+    result = subprocess.run(
+        [argv[0], "-X", "importtime", *argv[1:]],
+        input=payload,
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if cumulative.strip().isdigit() and not name.startswith("  "):
+            imports.append((name.strip(), int(cumulative)))
+    return sorted(imports, key=lambda item: -item[1])[:TOP_IMPORTS]
+
+
+def bench(plugin: str, name: str, event: str, runs: int, env: dict[str, str]) -> dict:
+    """Benchmark one hook; return its result record."""
+    argv = hook_command(plugin, name)
+    payloads = [
+        json.dumps({"session_id": "bench", "cwd": str(PROJECT_ROOT), **p}) for p in PAYLOADS[event]
+    ]
+    spawn(argv, payloads[0], env)  # Warm-up: bytecode, policy bundles and caches
+
+    latencies, rss, failures = [], [], 0
+    for i in range(runs):
+        elapsed, rss_mb, code = spawn(argv, payloads[i % len(payloads)], env)
+        latencies.append(elapsed)
+        rss.append(rss_mb)
+        failures += code not in (0, 2)  # 2 = deliberate block
+    latencies.sort()
+    return {
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(latencies[-1], 2),
+        "rss_mb": round(max(rss), 1),
+        "failures": failures,
+        "imports": import_breakdown(argv, payloads[0], env),
+    }
+
+
+def compare(
+    results: dict[str, dict], bare_ms: float, baseline: dict, tolerance: float
+) -> list[str]:
+    """Return the hooks whose p50, relative to a bare interpreter, regressed past tolerance."""
+    regressions = []
+    for label, result in results.items():
+        saved = baseline.get("hooks", {}).get(label)
+        if not saved:
+            continue
+        expected_ms = saved["p50_ms"] / baseline["bare_p50_ms"] * bare_ms
+        if (
+            result["p50_ms"] > expected_ms * (1 + tolerance)
+            and result["p50_ms"] - expected_ms > MIN_REGRESSION_MS
+        ):
+            regressions.append(
+                f"{label}: p50 {result['p50_ms']:.1f}ms, baseline scales to {expected_ms:.1f}ms"
+            )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--runs", type=int, default=50, help="runs per hook (default: 50)")
+    parser.add_argument("--hook", help="only benchmark hooks with this name")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE, help="baseline file")
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="write results as the new baseline"
+    )
+    parser.add_argument(
+        "--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed relative p50 growth"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as state:
+        env = {**os.environ, "AJBM_HOOK_STATE_DIR": state, "HOME": state}
+        bare = sorted(spawn([sys.executable, "-c", "pass"], "", env)[0] for _ in range(args.runs))
+        bare_ms = round(percentile(bare, 50), 2)
+
+        results = {}
+        for plugin, name, event in HOOKS:
+            if args.hook in (None, name):
+                results[f"{plugin}/{name}"] = bench(plugin, name, event, args.runs, env)
+
+    print(f"bare interpreter p50: {bare_ms:.1f}ms ({sys.executable})\n")
+    print(f"{'hook':<45} {'p50':>7} {'p95':>7} {'p99':>7} {'max':>7} {'rss MB':>7} {'fail':>5}")
+    for label, r in results.items():
+        print(
+            f"{label:<45} {r['p50_ms']:>7.1f} {r['p95_ms']:>7.1f} {r['p99_ms']:>7.1f} "
+            f"{r['max_ms']:>7.1f} {r['rss_mb']:>7.1f} {r['failures']:>5}"
+        )
+    for label, r in results.items():
+        print(f"\n{label} slowest imports (cumulative µs):")
+        for module, micros in r["imports"]:
+            print(f"  {micros:>8}  {module}")
+
+    if args.save_baseline:
+        baseline = {
+            "python": ".".join(map(str, sys.version_info[:2])),
+            "bare_p50_ms": bare_ms,
+            "hooks": {
+                label: {k: v for k, v in r.items() if k != "imports"}
+                for label, r in results.items()
+            },
+        }
+        args.baseline.write_text(json.dumps(baseline, indent=2) + "\n")
+        print(f"\nbaseline saved to {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"\nno baseline at {args.baseline}; run with --save-baseline")
+        return 0
+    regressions = compare(results, bare_ms, json.loads(args.baseline.read_text()), args.tolerance)
+    failures = [label for label, r in results.items() if r["failures"]]
+    for line in regressions:
+        print(f"\nREGRESSION {line}")
+    for label in failures:
+        print(f"\nFAILED {label} exited with an error")
+    if not regressions and not failures:
+        print("\nwithin baseline")
+    return 1 if regressions or failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Precompile plugin hooks and measure the startup time the launcher saves.
+
+Hooks run through hooks/run-hook.py (see hooks.json), which executes them
+from cached bytecode. The launcher writes __pycache__ on first use; this
+script fills it ahead of time, e.g. before packaging a read-only install.
+A read-only install uses the prebuilt bytecode as long as __pycache__ and
+its files aren't writable by group or others; otherwise the launcher caches
+its own copy in the per-user state dir.
+
+Usage:
+    python scripts/build_hooks.py              # Compile every wired hook
+    python scripts/build_hooks.py --measure    # Also compare per-call startup
+"""
+
+import argparse
+import json
+import os
+import py_compile
+import shlex
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+PLUGINS_DIR = PROJECT_ROOT / "plugins"
+LAUNCHER = "run-hook.py"
+
+# Representative stdin payload per hook event
+SAMPLE_PAYLOADS = {
+    "PreToolUse": {
+        "session_id": "build-hooks",
+        "tool_name": "Read",
+        "tool_input": {"file_path": "README.md"},
+    },
+    "PostToolUse": {
+        "session_id": "build-hooks",
+        "tool_name": "Bash",
+        "tool_input": {"command": "pytest -q"},
+        "tool_output": "3 passed in 0.12s",
+    },
+    "UserPromptSubmit": {"session_id": "build-hooks", "prompt": "help me debug this failing test"},
+}
+
+
+def wired_hooks() -> list[tuple[Path, str, list[str]]]:
+    """Return (plugin root, hook event, command argv) for every command hook in hooks.json files."""
+    hooks = []
+    for hooks_json in sorted(PLUGINS_DIR.glob("*/hooks/hooks.json")):
+        plugin_root = hooks_json.parent.parent
+        config = json.loads(hooks_json.read_text())
+        for event, matchers in config.get("hooks", {}).items():
+            for matcher in matchers:
+                for hook in matcher.get("hooks", []):
+                    if hook.get("type") == "command":
+                        command = hook["command"].replace("${CLAUDE_PLUGIN_ROOT}", str(plugin_root))
+                        hooks.append((plugin_root, event, shlex.split(command)))
+    return hooks
+
+
+def hook_source(argv: list[str]) -> Path:
+    """Return the hook script a hooks.json command runs (through the launcher or directly)."""
+    scripts = [Path(arg) for arg in argv if arg.endswith(".py")]
+    if scripts and scripts[0].name == LAUNCHER:
+        return scripts[0].parent / f"{argv[argv.index(str(scripts[0])) + 1]}.py"
+    return scripts[0]
+
+
+def build() -> list[Path]:
+    """Compile every wired hook and its launcher into __pycache__."""
+    compiled = []
+    for _, _, argv in wired_hooks():
+        source = hook_source(argv)
+        for path in (source, source.parent / LAUNCHER):
+            if path.exists() and path not in compiled:
+                py_compile.compile(str(path), doraise=True)
+                compiled.append(path)
+    return compiled
+
+
+def timed_run(argv: list[str], payload: str, env: dict[str, str]) -> float:
+    """Wall time in ms of running argv with payload on stdin."""
+    started = time.perf_counter()
+    subprocess.run(argv, input=payload, text=True, capture_output=True, env=env)
+    return (time.perf_counter() - started) * 1000
+
+
+def measure(runs: int) -> None:
+    """Print median per-call startup of each hook run directly vs through the launcher."""
+    print(f"{'hook':<45} {'direct ms':>10} {'launcher ms':>12} {'saved ms':>9}")
+    with tempfile.TemporaryDirectory() as state:
+        env = {**os.environ, "AJBM_HOOK_STATE_DIR": state}
+        for plugin_root, event, argv in wired_hooks():
+            payload = json.dumps({**SAMPLE_PAYLOADS.get(event, {}), "cwd": str(PROJECT_ROOT)})
+            argv = [sys.executable if arg == "python3" else arg for arg in argv]
+            source = hook_source(argv)
+            direct, launched = [], []
+            for _ in range(runs):
+                # Interleaved so machine load drifts affect both equally
+                direct.append(timed_run([sys.executable, str(source)], payload, env))
+                launched.append(timed_run(argv, payload, env))
+            direct_ms, launched_ms = statistics.median(direct), statistics.median(launched)
+            label = f"{plugin_root.name}/{source.name}"
+            print(
+                f"{label:<45} {direct_ms:>10.1f} {launched_ms:>12.1f} "
+                f"{direct_ms - launched_ms:>9.1f}"
+            )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "--measure", action="store_true", help="compare per-call startup after building"
+    )
+    parser.add_argument(
+        "--runs", type=int, default=30, help="runs per hook when measuring (default: 30)"
+    )
+    args = parser.parse_args()
+
+    for path in build():
+        print(f"compiled {path.relative_to(PROJECT_ROOT)}")
+    if args.measure:
+        print()
+        measure(args.runs)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
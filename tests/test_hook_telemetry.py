@@ -0,0 +1,157 @@
+"""Tests for the hook launcher's telemetry log and the hook-stats report.
+
+Tests verify:
+- Every launched hook call appends one record (hook, session, startup, time, size, exit)
+- The payload reaches the hook unchanged and its exit code is preserved
+- The log rotates to a single backup past its size limit
+- Read-only installs use prebuilt bytecode only if no one else can write to it
+- hook-stats reports per-hook percentiles, blocks and errors
+- Each plugin ships identical copies of the launcher and report
+"""
+
+import importlib.util
+import json
+import py_compile
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+# Get project root for absolute paths
+PROJECT_ROOT = Path(__file__).parent.parent
+SECURITY_HOOKS = PROJECT_ROOT / "plugins" / "security" / "hooks"
+SHARED_FILES = ["run-hook.py", "hook-stats.py"]
+
+
+def load(path: Path, name: str):
+    """Load a hyphenated hook script as a module."""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+run_hook = load(SECURITY_HOOKS / "run-hook.py", "run_hook")
+hook_stats = load(SECURITY_HOOKS / "hook-stats.py", "hook_stats")
+
+
+@pytest.fixture
+def state(tmp_path, monkeypatch):
+    """Isolated hook state directory."""
+    monkeypatch.setenv("AJBM_HOOK_STATE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def launch(state: Path, payload: dict) -> subprocess.CompletedProcess:
+    """Run smart-guard through the launcher as hooks.json does."""
+    return subprocess.run(
+        [sys.executable, "-S", "-E", str(SECURITY_HOOKS / "run-hook.py"), "smart-guard"],
+        input=json.dumps(payload),
+        capture_output=True,
+        text=True,
+        env={"AJBM_HOOK_STATE_DIR": str(state), "HOME": str(state)},
+    )
+
+
+def telemetry(state: Path) -> list[dict]:
+    return [json.loads(line) for line in (state / "hook-telemetry.jsonl").read_text().splitlines()]
+
+
+class TestLauncherTelemetry:
+    """run-hook.py records each call without changing the hook's behaviour."""
+
+    def test_records_one_line_per_call(self, state):
+        """Allowed and blocked calls are both recorded with their exit codes."""
+        allow = {"session_id": "sess-1", "tool_name": "Read", "tool_input": {"file_path": "a.md"}}
+        block = {"session_id": "sess-1", "tool_name": "Read", "tool_input": {"file_path": ".env"}}
+
+        assert launch(state, allow).returncode == 0
+        result = launch(state, block)
+        assert result.returncode == 2
+        assert json.loads(result.stdout)["decision"] == "block"
+
+        records = telemetry(state)
+        assert [r["exit"] for r in records] == [0, 2]
+        assert {r["hook"] for r in records} == {"smart-guard"}
+        assert {r["session"] for r in records} == {"sess-1"}
+        assert records[1]["size"] == len(json.dumps(block))
+        assert all(r["us"] > 0 and r["startup_us"] > 0 for r in records)
+
+    def test_session_id_is_sanitized(self):
+        """Only id characters survive, so a record is always valid JSON."""
+        assert run_hook.session_id('{"session_id": "a/../b c-1_2"}') == "abc-1_2"
+        assert run_hook.session_id('{"session_id": "ab\\"}, "x": "y"}') == "ab"
+        assert run_hook.session_id('{"tool_name": "Read"}') == ""
+
+    def test_log_rotates_past_limit(self, state, monkeypatch):
+        """The log is bounded: once over the limit it moves to a single .1 backup."""
+        monkeypatch.setattr(run_hook, "MAX_TELEMETRY_BYTES", 300)
+        for _ in range(5):
+            run_hook.record("smart-guard", '{"session_id":"s"}', 0, 0.0, 0.0)
+
+        assert (state / "hook-telemetry.jsonl.1").exists()
+        assert (state / "hook-telemetry.jsonl.1").stat().st_size <= 300 + 130
+        assert len(hook_stats.read_records(state / "hook-telemetry.jsonl")) == 5
+
+    def test_read_only_install_uses_prebuilt_bytecode(self, state, tmp_path, monkeypatch):
+        """Prebuilt __pycache__ is used unless others can write to it; else the state dir."""
+        hooks = tmp_path / "hooks"
+        hooks.mkdir()
+        (hooks / "guard.py").write_text("pass\n")
+        monkeypatch.setattr(run_hook, "HOOKS_DIR", str(hooks))
+        monkeypatch.setattr(run_hook.os, "access", lambda path, mode: False)
+        assert run_hook.pycache_prefix(str(hooks / "guard.py")) == str(state / "pycache")
+
+        py_compile.compile(str(hooks / "guard.py"), doraise=True)
+        (hooks / "__pycache__").chmod(0o755)
+        assert run_hook.pycache_prefix(str(hooks / "guard.py")) is None
+
+        (hooks / "__pycache__").chmod(0o777)
+        assert run_hook.pycache_prefix(str(hooks / "guard.py")) == str(state / "pycache")
+
+    def test_plugins_ship_identical_copies(self):
+        """Each plugin installs independently, so the shared files are copied, not imported."""
+        for name in SHARED_FILES:
+            copies = {p.read_text() for p in PROJECT_ROOT.glob(f"plugins/*/hooks/{name}")}
+            assert len(copies) == 1, f"{name} copies differ"
+
+
+class TestHookStats:
+    """hook-stats.py summarizes the shared log."""
+
+    def test_reports_percentiles_blocks_and_errors(self):
+        """Per-hook rows plus total added latency."""
+        records = [
+            {"hook": "smart-guard", "session": "a", "us": 1000 * i, "size": 10, "exit": 0}
+            for i in range(1, 101)
+        ]
+        records += [
+            {"hook": "smart-guard", "session": "b", "us": 5000, "size": 10, "exit": 2},
+            {"hook": "error-detection-hook", "session": "b", "us": 2000, "size": 10, "exit": 1},
+        ]
+        output = hook_stats.format_stats(records)
+
+        guard = next(line for line in output.splitlines() if line.startswith("smart-guard"))
+        assert guard.split()[1:9] == ["101", "2", "50.5", "50.0", "95.0", "99.0", "1", "0"]
+        detection = next(line for line in output.splitlines() if line.startswith("error-detection"))
+        assert detection.split()[8] == "1"
+        assert "over 102 calls in 2 sessions" in output
+
+    def test_startup_counts_toward_time_added(self):
+        """Interpreter startup is part of each call's time and the total."""
+        records = [
+            {"hook": "smart-guard", "session": "a", "startup_us": 20000, "us": 1000, "exit": 0},
+            {"hook": "smart-guard", "session": "a", "startup_us": 30000, "us": 3000, "exit": 0},
+        ]
+        guard = hook_stats.format_stats(records).splitlines()[1].split()
+        assert guard[4] == "21.0" and guard[6] == "33.0"
+        assert guard[9:] == ["20.0", "0.05"]
+        assert "0.05s over 2 calls" in hook_stats.format_stats(records)
+        assert "0.05s of it interpreter startup" in hook_stats.format_stats(records)
+
+    def test_empty_log(self, state):
+        """No log yet is reported, not an error."""
+        assert hook_stats.format_stats(hook_stats.read_records(state / "missing.jsonl")) == (
+            "No hook calls recorded."
+        )
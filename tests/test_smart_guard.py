@@ -0,0 +1,761 @@
+"""Adversarial fuzz and latency benchmark tests for the smart-guard hook.
+
+Tests verify:
+- Dangerous commands are blocked, including obfuscated rm -rf variants
+  (reordered/split flags, quoting tricks, binary paths, sudo, sh -c nesting)
+- Sensitive files are blocked for Read/Write/Edit/MultiEdit and Bash readers,
+  including compound commands, command substitution and unicode paths
+- Benign commands and paths are allowed (no false positives)
+- Every command the original regex checks blocked is still blocked, including
+  inside brace groups, if/for/while bodies and ! pipelines
+- Content Greps are blocked while a sensitive file is in scope, honouring
+  glob/type filters, index refresh and the index size and time limits
+- p50/p99 decision latency per tool stays within budget, so a pattern change
+  that adds latency fails here. Budgets are scaled by a calibration loop, so a
+  slower CI machine gets proportionally more time
+
+Corpora are generated from a fixed seed, so failures are reproducible.
+"""
+
+import functools
+import importlib.util
+import json
+import os
+import random
+import re
+import shlex
+import subprocess
+import sys
+import time
+import timeit
+from pathlib import Path
+
+import pytest
+
+# Get project root for absolute paths
+PROJECT_ROOT = Path(__file__).parent.parent
+HOOK_PATH = PROJECT_ROOT / "plugins" / "security" / "hooks" / "smart-guard.py"
+
+# Load smart-guard.py as a module (hyphenated file name isn't importable)
+spec = importlib.util.spec_from_file_location("smart_guard", HOOK_PATH)
+smart_guard = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(smart_guard)
+
+SEED = 20260419
+
+# p50/p99 budgets in microseconds for one in-process evaluate() call, on a
+# machine where one calibration iteration (see machine_scale) takes CALIBRATION_US
+CALIBRATION_US = 36
+LATENCY_BUDGET_US = {
+    "Bash": (300, 2000),
+    "Read": (150, 1000),
+    "Write": (150, 1000),
+    "MultiEdit": (15000, 40000),  # Batches of up to 300 files
+}
+
+SENSITIVE_PATHS = [
+    ".env",
+    ".env.local",
+    ".ENV.production",
+    "config/.env",
+    "~/.ssh/id_rsa",
+    "~/.ssh/config",
+    "/home/ünïcode/.ssh/id_ed25519",
+    "certs/server.pem",
+    "certs/server.KEY",
+    "tls/bundle.p12",
+    "~/.aws/credentials",
+    "~/.kube/config",
+    "/etc/shadow",
+    "~/.gnupg/secring.gpg",
+    "~/.netrc",
+    "~/.npmrc",
+    "./x/../.env",
+    "src//../.env.test",
+    "データ/.env",
+    ".devcontainer.local",
+]
+
+BENIGN_PATHS = [
+    "README.md",
+    "src/main.py",
+    "tests/test_env.py",
+    "docs/environment.md",
+    "config/settings.yaml",
+    ".env.example.md/notes.txt",
+    "src/keys/keyboard.py",
+    "scripts/ssh_setup.md",
+    "データ/notes.txt",
+    "/home/ünïcode/project/app.ts",
+    "public/favicon.ico",
+    "package.json",
+    "Cargo.toml",
+    "src/credentials_form.tsx",
+    ".github/workflows/ci.yml",
+]
+
+READERS = ["cat", "head", "tail", "less", "more", "bat", "strings", "base64", "xxd"]
+SEARCHERS = ["grep -n TOKEN", "rg -i secret", "grep -e KEY", "awk '{print $1}'", "sed -n 1,5p"]
+
+RM_PREFIXES = [
+    "", "sudo ", "/bin/", "\\", "command ", "FOO=1 ", "env ", "sudo -u root ", "nice -n 5 ",
+    "timeout 5 ",
+]
+RM_FLAGS = ["-rf", "-fr", "-Rf", "-r -f", "-f -r", "--recursive --force", "-rf --", "-r", "-rfv"]
+RM_TARGETS = ["/", "/*", "~", "~/", "$HOME", "${HOME}", "..", "../", "*", '"/"', "'~'", "/ "]
+COMMAND_WRAPPERS = [
+    "{}",
+    "cd build && {}",
+    "true; {}",
+    "ls || {}",
+    "echo start; {}; echo done",
+    "bash -c '{}'",
+    "{{ {}; }}",
+    "if true; then {}; fi",
+    "for f in a b; do {}; done",
+    "while true; do {}; done",
+    "! {}",
+]
+
+OTHER_DANGEROUS = [
+    "mkfs.ext4 /dev/sda1",
+    "dd if=/dev/zero of=/dev/sda bs=1M",
+    "echo x > /dev/sda",
+    ":(){ :|:& };:",
+    "chmod 777 /",
+]
+
+BENIGN_COMMANDS = [
+    "ls -la",
+    "git status",
+    "git diff --stat",
+    "pytest -q tests/test_env.py",
+    "npm run build",
+    "cargo test --all",
+    "rm -rf node_modules",
+    "rm -rf ./build dist/*",
+    "rm -f /tmp/output.log",
+    "rm -r build/",
+    "git rm -r --cached .",
+    "python -c 'print(1)'",
+    "echo done > build.log",
+    "cp .env.example .env.example.bak",
+    "grep -rn environment docs/",
+    "grep .env README.md",
+    "find . -name '*.py' | xargs wc -l",
+    "docker compose up -d",
+    "make -j8 && ./run_tests.sh",
+    "mkdir -p out && touch out/.keep",
+]
+
+
+def generate_bash_corpus(rng: random.Random, size: int) -> list[tuple[str, bool]]:
+    """Generate (command, should_block) pairs."""
+    corpus = []
+    for _ in range(size):
+        kind = rng.random()
+        if kind < 0.3:
+            target = rng.choice(RM_TARGETS)
+            command = f"{rng.choice(RM_PREFIXES)}rm {rng.choice(RM_FLAGS)} {target}"
+            wrapper = rng.choice(COMMAND_WRAPPERS)
+            if "'" in command and "'" in wrapper:
+                wrapper = "{}"
+            corpus.append((wrapper.format(command), True))
+        elif kind < 0.35:
+            corpus.append((rng.choice(COMMAND_WRAPPERS).format(rng.choice(OTHER_DANGEROUS)), True))
+        elif kind < 0.6:
+            path = rng.choice(SENSITIVE_PATHS)
+            reader = rng.choice(READERS + SEARCHERS)
+            form = rng.choice(
+                [
+                    f"{reader} {path}",
+                    f'{reader} "{path}"',
+                    f"{reader} README.md {path}",
+                    f"echo $({reader} {path})",
+                    f"ls && {reader} {path} | wc -l",
+                    f"echo `{reader} {path}`",
+                    f'echo "$({reader} {path} | head)"',
+                    f'X="$({reader} {path})"',
+                    f"sudo -u root {reader} {path}",
+                    f"nice -n 5 {reader} {path}",
+                    f"timeout 5 {reader} {path}",
+                    f"while read l; do echo $l; done < {path}",
+                    f"sh -c '{reader} {path}'" if "'" not in reader else f"{reader} {path}",
+                ]
+            )
+            wrapper = rng.choice(COMMAND_WRAPPERS)
+            if "'" in form and "'" in wrapper:
+                wrapper = "{}"
+            corpus.append((wrapper.format(form), True))
+        elif kind < 0.8:
+            path = rng.choice(BENIGN_PATHS)
+            reader = rng.choice(READERS + SEARCHERS)
+            form = rng.choice(
+                [
+                    f"{reader} {path}",
+                    f"{reader} {path} | head -5",
+                    f'echo "$({reader} {path})"',
+                    f"sudo -u root {reader} {path}",
+                    f"timeout 5 {reader} {path}",
+                ]
+            )
+            wrapper = rng.choice(COMMAND_WRAPPERS)
+            if "'" in form and "'" in wrapper:
+                wrapper = "{}"
+            corpus.append((wrapper.format(form), False))
+        else:
+            corpus.append((rng.choice(BENIGN_COMMANDS), False))
+    return corpus
+
+
+def generate_path_corpus(rng: random.Random, size: int) -> list[tuple[str, bool]]:
+    """Generate (file_path, should_block) pairs."""
+    corpus = []
+    for _ in range(size):
+        if rng.random() < 0.4:
+            corpus.append((rng.choice(SENSITIVE_PATHS), True))
+        else:
+            depth = "/".join(f"pkg{rng.randint(0, 99)}" for _ in range(rng.randint(0, 8)))
+            corpus.append((f"{depth}/{rng.choice(BENIGN_PATHS)}".lstrip("/"), False))
+    return corpus
+
+
+def timed(tool_name: str, tool_input: dict) -> tuple[dict | None, float]:
+    """Evaluate one call; return (decision, elapsed microseconds)."""
+    started = time.perf_counter()
+    decision = smart_guard.evaluate(tool_name, tool_input, smart_guard.PathResolver())
+    return decision, (time.perf_counter() - started) * 1_000_000
+
+
+def assert_accuracy(label: str, misses: list, false_blocks: list, total: int) -> None:
+    """Fail with an accuracy summary and examples of each error kind."""
+    errors = len(misses) + len(false_blocks)
+    accuracy = 1 - errors / total
+    assert errors == 0, (
+        f"{label}: accuracy {accuracy:.4%} over {total} cases; "
+        f"missed {len(misses)} (e.g. {misses[:5]}), "
+        f"false blocks {len(false_blocks)} (e.g. {false_blocks[:5]})"
+    )
+
+
+@functools.cache
+def machine_scale() -> float:
+    """
+    How much slower this machine is than the one the budgets were set on
+    (never below 1), from the best of five runs of a tokenize-and-match loop.
+    """
+    best = min(
+        timeit.repeat(
+            "shlex.split(command); pattern.search(command)",
+            setup=(
+                "import re, shlex; "
+                "command = \"cd build && sudo -u root cat 'a b' config/.env | head -5\"; "
+                "pattern = re.compile(r'\\brm\\s+-rf\\s+/(?:\\s|$)|(^|/)\\.env')"
+            ),
+            number=1000,
+            repeat=5,
+        )
+    )
+    return max(1.0, best * 1000 / CALIBRATION_US)
+
+
+def assert_latency(tool_name: str, samples: list[float]) -> None:
+    """Fail when p50 or p99 exceeds the tool's latency budget, scaled to this machine."""
+    samples = sorted(samples)
+    p50 = samples[len(samples) // 2]
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    budget_p50, budget_p99 = (budget * machine_scale() for budget in LATENCY_BUDGET_US[tool_name])
+    assert p50 <= budget_p50 and p99 <= budget_p99, (
+        f"{tool_name}: p50 {p50:.0f}µs (budget {budget_p50:.0f}), "
+        f"p99 {p99:.0f}µs (budget {budget_p99:.0f})"
+    )
+
+
+# The original hook's Bash checks, kept verbatim for the differential test
+LEGACY_SENSITIVE_FILES = [
+    r"(^|/)\.env(\.[^/]*)?$",
+    r"(^|/)\devcontainer.local(\.[^/]*)?$",
+    r"(^|/)\.ssh(/|$)",
+    r"\.(pem|key|crt|cer|pfx|p12)$",
+    r"(^|/)\.netrc$",
+    r"(^|/)\.npmrc$",
+    r"(^|/)\.pypirc$",
+    r"(^|/)\.aws/credentials",
+    r"(^|/)\.kube/config",
+    r"(^|/)etc/shadow",
+    r"(^|/)\.gnupg(/|$)",
+]
+LEGACY_READ_PATTERNS = [
+    r"\bcat\s+([^\s;|&>]+)",
+    r"\bless\s+([^\s;|&>]+)",
+    r"\bmore\s+([^\s;|&>]+)",
+    r"\bhead\s+(?:-\w+\s+)*([^\s;|&>]+)",
+    r"\btail\s+(?:-\w+\s+)*([^\s;|&>]+)",
+    r"\bgrep\s+(?:-\w+\s+)*\w+\s+([^\s;|&>]+)",
+    r"\bawk\s+.*\s+([^\s;|&>]+)$",
+    r"\bsed\s+.*\s+([^\s;|&>]+)$",
+]
+
+
+def legacy_blocks(command: str) -> bool:
+    """Whether the original regex checks blocked a Bash command."""
+    if any(re.search(p, command, re.IGNORECASE) for p in smart_guard.DANGEROUS_COMMANDS.values()):
+        return True
+    for pattern in LEGACY_READ_PATTERNS:
+        match = re.search(pattern, command)
+        if match:
+            path = match.group(1).strip().strip("\"'")
+            if any(re.search(p, path, re.IGNORECASE) for p in LEGACY_SENSITIVE_FILES):
+                return True
+    return False
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path, monkeypatch):
+    """Keep caches, logs and home-directory lookups inside tmp_path."""
+    monkeypatch.setenv("AJBM_HOOK_STATE_DIR", str(tmp_path / "state"))
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+    monkeypatch.setattr(smart_guard, "_active_policy", None)
+
+
+class TestBashFuzz:
+    """Fuzzed Bash commands against labels, with latency per decision."""
+
+    def test_bash_corpus_accuracy_and_latency(self):
+        """20k generated commands: no missed bypasses, no false blocks, within budget."""
+        corpus = generate_bash_corpus(random.Random(SEED), 20000)
+        misses, false_blocks, samples = [], [], []
+        for command, should_block in corpus:
+            decision, elapsed = timed("Bash", {"command": command})
+            samples.append(elapsed)
+            if should_block and decision is None:
+                misses.append(command)
+            elif not should_block and decision is not None:
+                false_blocks.append((command, decision["rule"]))
+
+        assert_accuracy("Bash", misses, false_blocks, len(corpus))
+        assert_latency("Bash", samples)
+
+    def test_blocks_everything_the_regex_chain_blocked(self):
+        """Differential: no command the original regex checks blocked is allowed now."""
+        corpus = generate_bash_corpus(random.Random(SEED + 1), 20000)
+        regressions = [
+            command
+            for command, _ in corpus
+            if legacy_blocks(command) and smart_guard.evaluate("Bash", {"command": command}) is None
+        ]
+        assert not regressions, f"{len(regressions)} regressions, e.g. {regressions[:5]}"
+
+    @pytest.mark.parametrize(
+        "command",
+        [
+            "rm -fr /",
+            "rm -r -f ~",
+            'rm -rf "/"',
+            "r''m -rf /",
+            "/bin/rm --recursive --force /*",
+            "sudo rm -rf $HOME",
+            "bash -c 'rm -rf ..'",
+            "\\rm -rf ~/",
+            "cat a .env",
+            "ls | cat .env",
+            "echo $(cat ~/.ssh/id_rsa)",
+            "grep -f .env README.md",
+            "head -n 5 < .env",
+            'eval "cat .env"',
+            'echo "$(cat .env | head)"',
+            'X="$(cat ~/.ssh/id_rsa)"',
+            'echo "`cat .env`"',
+            'echo "$(echo "$(cat .env)")"',
+            "sudo -u root cat .env",
+            "sudo -Eu root cat .env",
+            "nice -n 5 cat .env",
+            "timeout 5 cat .env",
+            "timeout -s KILL 5 rm -rf /",
+            "stdbuf -o L cat .env",
+            "xargs -n 1 cat .env",
+            'env -S "cat .env"',
+            "{ cat .env; }",
+            "if true; then cat .env; fi",
+            "for f in a; do cat .env; done",
+            "while true; do cat .env; done",
+            "until false; do head -1 .env; done",
+            "case x in a) cat .env;; esac",
+            "! cat .env",
+            "{ rm -rf /; }",
+            "if true; then rm -rf ~; fi",
+            "then rm -fr /",
+            "bash -c 'X=\"$(cat .env)\"'",
+            "sh -c 'echo \"`cat .env`\"'",
+        ],
+    )
+    def test_known_bypasses_are_blocked(self, command):
+        """Bypasses found by earlier fuzzing must stay closed."""
+        assert smart_guard.evaluate("Bash", {"command": command}) is not None
+
+    @pytest.mark.parametrize(
+        "command",
+        [
+            "echo '$(cat .env)'",
+            'echo "$(date)" > build.log',
+            "timeout 5 pytest -q",
+            "sudo -u www-data ls /var/www",
+            "nice -n 10 make -j8",
+            "for f in .env README.md; do echo $f; done",
+            "if [ -f .env ]; then echo found; fi",
+            "case .env in *) echo ok;; esac",
+        ],
+    )
+    def test_prefixes_and_quoted_substitutions_allow_benign(self, command):
+        """Option values, single-quoted text and loop headers aren't taken for commands."""
+        assert smart_guard.evaluate("Bash", {"command": command}) is None
+
+    def test_very_long_pipeline_stays_fast(self):
+        """A 2000-stage pipeline is parsed and checked in well under a second."""
+        command = " | ".join(f"grep -v pattern{i} file{i}.txt" for i in range(2000))
+        decision, elapsed = timed("Bash", {"command": command})
+        assert decision is None
+        assert elapsed < 500_000 * machine_scale(), f"{elapsed:.0f}µs"
+
+    def test_long_single_token_stays_fast(self):
+        """A 1MB argument (e.g. base64 blob) is checked in linear, not quadratic, time."""
+        command = "echo " + "A" * 1_000_000 + " | base64 -d > out.bin"
+        decision, elapsed = timed("Bash", {"command": command})
+        assert decision is None
+        assert elapsed < 1_500_000 * machine_scale(), f"{elapsed:.0f}µs"
+
+
+class TestPathFuzz:
+    """Fuzzed Read/Write/MultiEdit paths against labels, with latency per decision."""
+
+    @pytest.mark.parametrize("tool_name", ["Read", "Write"])
+    def test_path_corpus_accuracy_and_latency(self, tool_name):
+        """10k generated paths: every sensitive path blocked, every benign one allowed."""
+        corpus = generate_path_corpus(random.Random(SEED), 10000)
+        misses, false_blocks, samples = [], [], []
+        for path, should_block in corpus:
+            decision, elapsed = timed(tool_name, {"file_path": path, "content": "x"})
+            samples.append(elapsed)
+            if should_block and decision is None:
+                misses.append(path)
+            elif not should_block and decision is not None:
+                false_blocks.append((path, decision["rule"]))
+
+        assert_accuracy(tool_name, misses, false_blocks, len(corpus))
+        assert_latency(tool_name, samples)
+
+    def test_multiedit_batches(self):
+        """Large MultiEdit batches: blocked iff any file is sensitive, within budget."""
+        rng = random.Random(SEED)
+        misses, false_blocks, samples = [], [], []
+        for _ in range(100):
+            edits = [{"file_path": path} for path, _ in generate_path_corpus(rng, 300) if not _]
+            should_block = rng.random() < 0.5
+            if should_block:
+                edits.insert(
+                    rng.randrange(len(edits) + 1), {"file_path": rng.choice(SENSITIVE_PATHS)}
+                )
+            decision, elapsed = timed("MultiEdit", {"file_path": "src/a.py", "edits": edits})
+            samples.append(elapsed)
+            if should_block and decision is None:
+                misses.append(len(edits))
+            elif not should_block and decision is not None:
+                false_blocks.append(decision["reason"])
+
+        assert_accuracy("MultiEdit", misses, false_blocks, 100)
+        assert_latency("MultiEdit", samples)
+
+
+class TestCanonicalization:
+    """Symlinks and hard links can't hide a sensitive target."""
+
+    def test_symlink_to_ssh_key_is_blocked(self, tmp_path):
+        """Reading a symlink that points into ~/.ssh is blocked."""
+        key = tmp_path / "home" / ".ssh" / "id_rsa"
+        key.parent.mkdir(parents=True)
+        key.write_text("secret")
+        link = tmp_path / "innocent.txt"
+        link.symlink_to(key)
+
+        resolver = smart_guard.PathResolver(str(tmp_path))
+        assert smart_guard.evaluate("Read", {"file_path": "innocent.txt"}, resolver) is not None
+
+    def test_hard_link_to_known_secret_is_blocked(self, tmp_path):
+        """A hard link to a seeded home secret is blocked under any name."""
+        key = tmp_path / "home" / ".ssh" / "id_rsa"
+        key.parent.mkdir(parents=True)
+        key.write_text("secret")
+        (tmp_path / "notes.txt").hardlink_to(key)
+
+        resolver = smart_guard.PathResolver(str(tmp_path))
+        resolver.seed_home_secrets()
+        assert smart_guard.evaluate("Read", {"file_path": "notes.txt"}, resolver) is not None
+
+
+class TestScriptInspection:
+    """Local scripts run by a Bash command are scanned, with verdicts cached."""
+
+    @pytest.fixture
+    def workspace(self, tmp_path):
+        (tmp_path / "cleanup.sh").write_text("#!/bin/bash\necho cleaning\nrm -fr ~\n")
+        (tmp_path / "purge.py").write_text('import os\nos.system("rm -rf ~/")\n')
+        (tmp_path / "leak.sh").write_text("# print config\ncat .env | head\n")
+        (tmp_path / "outer.sh").write_text("#!/usr/bin/env bash\n# cat .env\nsource ./cleanup.sh\n")
+        (tmp_path / "fine.sh").write_text("#!/bin/sh\n# rm -rf ~ would be bad\necho ok\n")
+        for name in ("cleanup.sh", "outer.sh", "fine.sh"):
+            (tmp_path / name).chmod(0o755)
+        return tmp_path
+
+    @pytest.mark.parametrize(
+        "command",
+        [
+            "bash cleanup.sh",
+            "sh -x cleanup.sh --force",
+            "sudo ./cleanup.sh",
+            "python purge.py",
+            "python3 -u purge.py",
+            "bash < leak.sh",
+            "source leak.sh",
+            "./outer.sh",
+            "bash -c 'bash cleanup.sh'",
+        ],
+    )
+    def test_dangerous_scripts_are_blocked(self, workspace, command):
+        """Scripts run via interpreters, source, stdin, directly or nested are inspected."""
+        resolver = smart_guard.PathResolver(str(workspace))
+        assert smart_guard.evaluate("Bash", {"command": command}, resolver) is not None
+
+    @pytest.mark.parametrize(
+        "command", ["bash fine.sh", "./fine.sh", "python -m pytest", "node missing.js"]
+    )
+    def test_benign_scripts_are_allowed(self, workspace, command):
+        """Comments aren't commands; inline code and missing files are skipped."""
+        resolver = smart_guard.PathResolver(str(workspace))
+        assert smart_guard.evaluate("Bash", {"command": command}, resolver) is None
+
+    def test_unchanged_script_is_not_read_again(self, workspace, monkeypatch):
+        """A repeat invocation reuses the verdict after a stat."""
+        resolver = smart_guard.PathResolver(str(workspace))
+        assert smart_guard.evaluate("Bash", {"command": "bash fine.sh"}, resolver) is None
+        monkeypatch.setattr(
+            smart_guard, "inspect_script", lambda *args: pytest.fail("script re-read")
+        )
+        assert smart_guard.evaluate("Bash", {"command": "bash fine.sh --verbose"}, resolver) is None
+
+    def test_touched_script_keeps_verdict_without_rescan(self, workspace, monkeypatch):
+        """A new mtime with the same content hash skips the scan."""
+        resolver = smart_guard.PathResolver(str(workspace))
+        script = workspace / "fine.sh"
+        smart_guard.evaluate("Bash", {"command": "./fine.sh"}, resolver)
+        mtime = script.stat().st_mtime_ns + 1_000_000_000
+        os.utime(script, ns=(mtime, mtime))
+        monkeypatch.setattr(smart_guard, "shebang_is_shell", lambda *args: pytest.fail("rescanned"))
+        assert smart_guard.evaluate("Bash", {"command": "./fine.sh"}, resolver) is None
+        assert resolver.scripts[str(script)][3] == mtime
+
+    def test_cached_allow_is_dropped_when_script_is_edited(self, workspace):
+        """Editing a script in place invalidates the session's cached decision."""
+        payload = {"command": "bash fine.sh"}
+        assert smart_guard.cached_evaluate("s", "Bash", payload, str(workspace)) == (None, False)
+        assert smart_guard.cached_evaluate("s", "Bash", payload, str(workspace)) == (None, True)
+
+        with open(workspace / "fine.sh", "a") as f:
+            f.write("rm -rf ~\n")
+        decision, hit = smart_guard.cached_evaluate("s", "Bash", payload, str(workspace))
+        assert decision is not None and not hit
+
+
+class TestGrepIndex:
+    """Content Greps are checked against a workspace index of sensitive files."""
+
+    @pytest.fixture
+    def workspace(self, tmp_path):
+        root = tmp_path / "repo"
+        (root / "src" / "app").mkdir(parents=True)
+        (root / "docs").mkdir()
+        (root / "src" / "app" / "main.py").write_text("print('hi')\n")
+        (root / "docs" / "index.md").write_text("# Docs\n")
+        (root / "config").mkdir()
+        (root / "config" / ".env").write_text("API_KEY=secret\n")
+        return root
+
+    def grep(self, workspace: Path, **tool_input) -> dict | None:
+        resolver = smart_guard.PathResolver(str(workspace))
+        return smart_guard.evaluate("Grep", {"output_mode": "content", **tool_input}, resolver)
+
+    def touch(self, directory: Path) -> None:
+        """Move a directory's mtime on, as filesystems with coarse timestamps may not."""
+        mtime = directory.stat().st_mtime_ns + 1_000_000_000
+        os.utime(directory, ns=(mtime, mtime))
+
+    def test_sensitive_file_in_scope_blocks_content_search(self, workspace):
+        decision = self.grep(workspace, pattern="KEY")
+        assert decision is not None and "config/.env" in decision["reason"]
+        assert self.grep(workspace, pattern="KEY", path="src") is None
+        # Listing matching files doesn't print their contents
+        resolver = smart_guard.PathResolver(str(workspace))
+        assert smart_guard.evaluate("Grep", {"pattern": "KEY"}, resolver) is None
+
+    @pytest.mark.parametrize(
+        ("filters", "blocked"),
+        [
+            ({"glob": "*.py"}, False),
+            ({"glob": "*.{py,md}"}, False),
+            ({"glob": "config/*"}, True),
+            ({"glob": ".env*"}, True),
+            ({"glob": "!.env*"}, False),
+            ({"glob": "!*.md"}, True),
+            ({"type": "py"}, False),
+        ],
+    )
+    def test_glob_and_type_filters(self, workspace, filters, blocked):
+        """Only files the filters let through count, and !globs exclude."""
+        assert (self.grep(workspace, pattern="KEY", **filters) is not None) == blocked
+
+    def test_hidden_and_ignored_files_count_as_searched(self, workspace):
+        """The hook can't see ripgrep's filters, so .gitignore and dotfiles don't hide a file."""
+        (workspace / "config" / ".env").unlink()
+        (workspace / ".gitignore").write_text(".env.example\n")
+        (workspace / ".env.example").write_text("API_KEY=\n")
+        decision = self.grep(workspace, pattern="KEY")
+        assert decision is not None and ".env.example" in decision["reason"]
+
+    def test_refresh_sees_added_and_removed_files(self, workspace):
+        assert self.grep(workspace, pattern="x", path="docs") is None
+
+        (workspace / "docs" / "deploy").mkdir()
+        (workspace / "docs" / "deploy" / "server.pem").write_text("key")
+        self.touch(workspace / "docs")
+        assert self.grep(workspace, pattern="x", path="docs") is not None
+
+        (workspace / "docs" / "deploy" / "server.pem").unlink()
+        (workspace / "docs" / "deploy").rmdir()
+        self.touch(workspace / "docs")
+        assert self.grep(workspace, pattern="x", path="docs") is None
+
+    def test_refresh_checks_only_the_searched_scope(self, workspace):
+        """A search below the root leaves directories outside it unchecked."""
+        assert self.grep(workspace, pattern="x", path="src") is None
+        indexed = smart_guard.load_workspace_index(str(workspace), "src")["dirs"]["docs"]
+
+        (workspace / "docs" / "server.pem").write_text("key")
+        self.touch(workspace / "docs")
+        assert self.grep(workspace, pattern="x", path="src") is None
+        assert smart_guard.load_workspace_index(str(workspace), "src")["dirs"]["docs"] == indexed
+        assert self.grep(workspace, pattern="x", path="docs") is not None
+
+    def test_skipped_directory_is_indexed_when_searched(self, workspace):
+        """node_modules isn't walked with the workspace, but is scanned when targeted."""
+        (workspace / "node_modules" / "pkg").mkdir(parents=True)
+        (workspace / "node_modules" / "pkg" / ".env").write_text("TOKEN=1\n")
+        assert self.grep(workspace, pattern="x", glob="*.js") is None
+        assert self.grep(workspace, pattern="x", path="node_modules") is not None
+
+    def test_truncated_index_blocks_unscanned_scope(self, workspace, monkeypatch):
+        """Directories past the walk limit are never assumed clean."""
+        for name in ("a", "b", "c"):
+            (workspace / "docs" / name).mkdir()
+        monkeypatch.setattr(smart_guard, "MAX_INDEX_DIRS", 3)
+
+        decision = self.grep(workspace, pattern="x", glob="*.md")
+        assert decision is not None and decision["rule"] == "grep_scope_too_large"
+        index = smart_guard.load_workspace_index(str(workspace))
+        assert index["pending"]
+        for rel in index["pending"]:
+            assert self.grep(workspace, pattern="x", path=rel) is not None
+        for rel in set(index["dirs"]) - {"", "config"}:
+            incomplete = any(smart_guard.in_scope(p, rel) for p in index["pending"])
+            assert (self.grep(workspace, pattern="x", path=rel) is not None) == incomplete
+
+        # Once there is room under the limit, the walk resumes
+        monkeypatch.setattr(smart_guard, "MAX_INDEX_DIRS", 100)
+        assert self.grep(workspace, pattern="x", glob="*.md") is None
+        assert not smart_guard.load_workspace_index(str(workspace))["pending"]
+
+    def test_walk_continues_across_calls_within_budget(self, workspace, monkeypatch):
+        """A walk out of time blocks the search, and later calls pick up where it stopped."""
+        for name in ("a", "b", "c"):
+            (workspace / "docs" / name).mkdir()
+        # Each directory scan takes a second; stats are free
+        clock = [0]
+        scan = smart_guard.scan_directory
+
+        def slow_scan(*args):
+            clock[0] += 1
+            return scan(*args)
+
+        monkeypatch.setattr(smart_guard, "scan_directory", slow_scan)
+        monkeypatch.setattr(smart_guard.time, "perf_counter", lambda: clock[0])
+        monkeypatch.setattr(smart_guard, "INDEX_TIME_BUDGET", 3)
+
+        decisions = [self.grep(workspace, pattern="x", glob="*.md") for _ in range(3)]
+        assert decisions[0]["rule"] == "grep_scope_too_large"
+        assert decisions[-1] is None
+        index = smart_guard.load_workspace_index(str(workspace))
+        assert {"docs/a", "docs/b", "docs/c"} <= set(index["dirs"])
+
+    def test_refresh_out_of_time_blocks(self, workspace, monkeypatch):
+        """An index whose scope can't be re-checked in time is not trusted."""
+        assert self.grep(workspace, pattern="x", glob="*.md") is None
+        monkeypatch.setattr(smart_guard, "INDEX_TIME_BUDGET", 0)
+
+        decision = self.grep(workspace, pattern="x", glob="*.md")
+        assert decision is not None and decision["rule"] == "grep_scope_too_large"
+        assert smart_guard.load_workspace_index(str(workspace)) is None
+
+
+class TestHookProcess:
+    """End-to-end: the hook as Claude Code runs it."""
+
+    def run_hook(self, payload: dict, tmp_path: Path) -> subprocess.CompletedProcess:
+        env = {"AJBM_HOOK_STATE_DIR": str(tmp_path / "state"), "HOME": str(tmp_path / "home")}
+        return subprocess.run(
+            [sys.executable, str(HOOK_PATH)],
+            input=json.dumps(payload),
+            capture_output=True,
+            text=True,
+            env=env,
+            timeout=30,
+        )
+
+    def test_block_exits_2_with_documented_keys(self, tmp_path):
+        """A block prints {decision, reason} and exits 2."""
+        result = self.run_hook(
+            {"session_id": "s", "tool_name": "Read", "tool_input": {"file_path": ".env"}}, tmp_path
+        )
+        assert result.returncode == 2
+        assert set(json.loads(result.stdout)) == {"decision", "reason"}
+
+    def test_allow_exits_0_silently(self, tmp_path):
+        """An allow prints nothing and exits 0."""
+        result = self.run_hook(
+            {"session_id": "s", "tool_name": "Bash", "tool_input": {"command": "ls"}}, tmp_path
+        )
+        assert result.returncode == 0
+        assert result.stdout == ""
+
+    def test_launcher_runs_hook_from_cached_bytecode(self, tmp_path):
+        """The hooks.json command (run-hook.py under -S -E) runs the hook as __main__."""
+        command = json.loads((HOOK_PATH.parent / "hooks.json").read_text())["hooks"]["PreToolUse"][
+            0
+        ]["hooks"][0]
+        argv = shlex.split(
+            command["command"].replace("${CLAUDE_PLUGIN_ROOT}", str(HOOK_PATH.parent.parent))
+        )
+        env = {"AJBM_HOOK_STATE_DIR": str(tmp_path / "state"), "HOME": str(tmp_path / "home")}
+        payload = json.dumps(
+            {"session_id": "s", "tool_name": "Read", "tool_input": {"file_path": ".env"}}
+        )
+
+        result = subprocess.run(
+            [sys.executable, *argv[1:]], input=payload, capture_output=True, text=True, env=env
+        )
+        assert result.returncode == 2
+        assert json.loads(result.stdout)["decision"] == "block"
+
+    def test_invalid_json_is_allowed(self, tmp_path):
+        """Non-JSON input fails open."""
+        result = subprocess.run(
+            [sys.executable, str(HOOK_PATH)], input="not json", capture_output=True, text=True
+        )
+        assert result.returncode == 0
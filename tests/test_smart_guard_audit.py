@@ -0,0 +1,118 @@
+"""Tests for smart-guard's decision audit log.
+
+Tests verify:
+- Each hook call appends one record naming the rule and layer, never the input
+- The log rotates by size into a fixed number of numbered backups
+- Records are read back across backups, oldest first, skipping torn lines
+- --audit-summary reports per-tool block rates, latency percentiles and top rules
+"""
+
+import importlib.util
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+# Get project root for absolute paths
+PROJECT_ROOT = Path(__file__).parent.parent
+HOOK_PATH = PROJECT_ROOT / "plugins" / "security" / "hooks" / "smart-guard.py"
+
+# Load smart-guard.py as a module (hyphenated file name isn't importable)
+spec = importlib.util.spec_from_file_location("smart_guard_audit", HOOK_PATH)
+smart_guard = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(smart_guard)
+
+
+@pytest.fixture
+def state(tmp_path, monkeypatch):
+    """Isolated hook state directory."""
+    monkeypatch.setenv("AJBM_HOOK_STATE_DIR", str(tmp_path / "state"))
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+    return tmp_path / "state"
+
+
+def run_hook(state: Path, *args: str, payload: dict | None = None) -> subprocess.CompletedProcess:
+    """Run the hook as Claude Code does."""
+    return subprocess.run(
+        [sys.executable, str(HOOK_PATH), *args],
+        input=json.dumps(payload) if payload else "",
+        capture_output=True,
+        text=True,
+        env={"AJBM_HOOK_STATE_DIR": str(state), "HOME": str(state.parent / "home")},
+    )
+
+
+class TestAuditLog:
+    """Writing, rotating and reading the log."""
+
+    def test_hook_call_appends_one_record(self, state):
+        """Allowed and blocked calls are both recorded; the input only as a checksum."""
+        run_hook(state, payload={"tool_name": "Read", "tool_input": {"file_path": "a.md"}})
+        result = run_hook(state, payload={"tool_name": "Read", "tool_input": {"file_path": ".env"}})
+        assert result.returncode == 2
+
+        log = state / smart_guard.AUDIT_FILE
+        allow, block = smart_guard.read_audit_records(str(log))
+        assert (allow["decision"], allow["rule"], allow["layer"]) == ("allow", None, None)
+        assert (block["decision"], block["rule"]) == ("block", "env_file")
+        assert block["layer"] == "builtin"
+        assert len(block["input"]) == 8 and block["input"] != allow["input"]
+        assert ".env" not in log.read_text() and "a.md" not in log.read_text()
+
+    def test_log_rotates_into_numbered_backups(self, state, monkeypatch):
+        """Past the size limit the log shifts to .1, .2, ...; the oldest backup is dropped."""
+        monkeypatch.setattr(smart_guard, "MAX_AUDIT_BYTES", 100)
+        path = str(state / smart_guard.AUDIT_FILE)
+        for i in range(13):
+            smart_guard.write_audit_record({"tool": "Read", "seq": i, "pad": "x" * 40}, path)
+
+        backups = sorted(p.name for p in state.iterdir())
+        assert backups == [
+            smart_guard.AUDIT_FILE,
+            *(f"{smart_guard.AUDIT_FILE}.{n}" for n in range(1, smart_guard.AUDIT_BACKUPS + 1)),
+        ]
+        # Two records per file; those older than the last backup are gone
+        seqs = [r["seq"] for r in smart_guard.read_audit_records(path)]
+        assert seqs == list(range(6, 13))
+
+    def test_read_skips_torn_lines(self, state):
+        state.mkdir()
+        path = state / smart_guard.AUDIT_FILE
+        (state / f"{smart_guard.AUDIT_FILE}.1").write_text('{"seq": 0}\n{"seq": 1, "to')
+        path.write_text('{"seq": 2}\n')
+        assert [r["seq"] for r in smart_guard.read_audit_records(str(path))] == [0, 2]
+
+    def test_unwritable_log_never_fails(self, state):
+        state.mkdir()
+        (state / "blocker").write_text("")
+        smart_guard.write_audit_record({"tool": "Read"}, str(state / "blocker" / "audit.jsonl"))
+
+
+class TestAuditSummary:
+    """--audit-summary output."""
+
+    def test_summary_counts_rates_and_rules(self):
+        records = [{"tool": "Bash", "decision": "allow", "us": 10 * i} for i in range(1, 9)]
+        block = {"decision": "block"}
+        records += [
+            {**block, "tool": "Bash", "rule": "rm_rf_root", "layer": "builtin", "us": 90},
+            {**block, "tool": "Bash", "rule": "curl_pipe", "layer": "project", "us": 100},
+            {**block, "tool": "Read", "rule": "env_file", "cached": True, "us": 5},
+            {**block, "tool": "Read", "rule": "env_file", "us": 7},
+        ]
+        lines = smart_guard.format_audit_summary(records).splitlines()
+
+        bash = next(line for line in lines if line.startswith("Bash"))
+        assert bash.split()[1:] == ["10", "2", "20.0%", "0", "50", "100", "100"]
+        read = next(line for line in lines if line.startswith("Read"))
+        assert read.split()[1:5] == ["2", "2", "100.0%", "1"]
+        top = lines[lines.index("Top rules:") + 1 :]
+        assert top[0].split() == ["2", "env_file", "(builtin)"]
+        assert "curl_pipe (project)" in "\n".join(top)
+
+    def test_summary_of_empty_log(self, state):
+        result = run_hook(state, "--audit-summary")
+        assert result.returncode == 0
+        assert result.stdout.strip() == "No smart-guard decisions recorded."
@@ -0,0 +1,214 @@
+"""Tests for smart-guard's layered policy files.
+
+Tests verify:
+- Project policies can only add rules; the user policy can also disable or redefine them
+- Malformed files and invalid rules are skipped, keeping the rest of the layer
+- Rules are validated as they run, inside the combined case-insensitive pattern
+- A policy file whose rules can't be combined is dropped, keeping the other layers
+- Policy bundles are only trusted from a state dir this user owns and alone can write
+"""
+
+import importlib.util
+import json
+import marshal
+import os
+from pathlib import Path
+
+import pytest
+
+# Get project root for absolute paths
+PROJECT_ROOT = Path(__file__).parent.parent
+HOOK_PATH = PROJECT_ROOT / "plugins" / "security" / "hooks" / "smart-guard.py"
+
+# Load smart-guard.py as a module (hyphenated file name isn't importable)
+spec = importlib.util.spec_from_file_location("smart_guard_policy", HOOK_PATH)
+smart_guard = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(smart_guard)
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path, monkeypatch):
+    """Keep bundles and home-directory policy files inside tmp_path."""
+    monkeypatch.setenv("AJBM_HOOK_STATE_DIR", str(tmp_path / "state"))
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+    monkeypatch.setattr(smart_guard, "_active_policy", None)
+
+
+def write_policy(path: Path, policy: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(policy))
+
+
+def evaluate(workspace: Path, tool_name: str, tool_input: dict) -> dict | None:
+    """Load the workspace policy and evaluate one tool call under it."""
+    smart_guard.activate_policy(smart_guard.load_policy(str(workspace)))
+    return smart_guard.evaluate(tool_name, tool_input, smart_guard.PathResolver(str(workspace)))
+
+
+def layer(name: str, policy: dict | str) -> tuple[str, bytes]:
+    raw = policy if isinstance(policy, str) else json.dumps(policy)
+    return name, raw.encode()
+
+
+class TestPolicyLayers:
+    """merge_policy_layers() precedence and override rights."""
+
+    def test_layers_add_rules(self):
+        sensitive, dangerous, layers = smart_guard.merge_policy_layers(
+            [
+                layer("user", {"sensitive_files": {"secrets_yaml": ["name", ["secrets.yaml"]]}}),
+                layer("project", {"dangerous_commands": {"tf_destroy": r"terraform\s+destroy"}}),
+            ]
+        )
+        assert sensitive["secrets_yaml"] == ("name", ("secrets.yaml",))
+        assert dangerous["tf_destroy"] == r"terraform\s+destroy"
+        assert (layers["secrets_yaml"], layers["tf_destroy"], layers["env_file"]) == (
+            "user", "project", "builtin"
+        )
+
+    def test_project_cannot_disable_or_redefine(self):
+        """A checked-out repository can't switch off the user's protections."""
+        sensitive, dangerous, layers = smart_guard.merge_policy_layers(
+            [
+                layer(
+                    "project",
+                    {
+                        "disable": ["env_file", "rm_rf_root"],
+                        "sensitive_files": {"env_file": ["name", ["nothing"]]},
+                        "dangerous_commands": {"rm_rf_root": "never-matches"},
+                    },
+                )
+            ]
+        )
+        assert sensitive["env_file"] == smart_guard.SENSITIVE_FILES["env_file"]
+        assert dangerous["rm_rf_root"] == smart_guard.DANGEROUS_COMMANDS["rm_rf_root"]
+        assert layers["env_file"] == layers["rm_rf_root"] == "builtin"
+
+    def test_project_cannot_redefine_user_rules(self):
+        user = {"dangerous_commands": {"tf_destroy": r"terraform\s+destroy"}}
+        project = {"dangerous_commands": {"tf_destroy": "never-matches"}}
+        _, dangerous, layers = smart_guard.merge_policy_layers(
+            [layer("user", user), layer("project", project)]
+        )
+        assert (dangerous["tf_destroy"], layers["tf_destroy"]) == (r"terraform\s+destroy", "user")
+
+    def test_user_can_disable_and_redefine(self):
+        sensitive, dangerous, layers = smart_guard.merge_policy_layers(
+            [
+                layer(
+                    "user",
+                    {
+                        "disable": ["npmrc", "mkfs"],
+                        "dangerous_commands": {"rm_rf_root": r"\brm\s+-rf\s+/$"},
+                    },
+                )
+            ]
+        )
+        assert "npmrc" not in sensitive and "mkfs" not in dangerous
+        assert "npmrc" not in layers and "mkfs" not in layers
+        assert (dangerous["rm_rf_root"], layers["rm_rf_root"]) == (r"\brm\s+-rf\s+/$", "user")
+
+    @pytest.mark.parametrize(
+        "policy",
+        [
+            "not json",
+            '["a list"]',
+            {"sensitive_files": {"bad name": ["name", ["x.txt"]]}},
+            {"sensitive_files": {"bad_kind": ["glob", ["*.txt"]]}},
+            {"sensitive_files": {"bad_values": ["name", "x.txt"]}},
+            {"sensitive_files": {"empty_value": ["name", [""]]}},
+            {"sensitive_files": {"bad_regex": ["regex", ["ok", "(?i)x"]]}},
+            {"dangerous_commands": {"bad_regex": "unbalanced("}},
+            {"dangerous_commands": {"named_group": "(?P<x>rm)"}},
+        ],
+    )
+    def test_invalid_files_and_rules_are_skipped(self, policy):
+        """Nothing from an invalid entry is merged, and the hook keeps working."""
+        merged = smart_guard.merge_policy_layers([layer("user", policy)])
+        assert merged == smart_guard.merge_policy_layers([])
+
+    def test_invalid_rule_keeps_the_rest_of_the_layer(self):
+        policy = {
+            "dangerous_commands": {"bad_regex": "unbalanced(", "tf_destroy": r"terraform\s+destroy"}
+        }
+        _, dangerous, _ = smart_guard.merge_policy_layers([layer("project", policy)])
+        assert "bad_regex" not in dangerous and "tf_destroy" in dangerous
+
+
+class TestRuleValidation:
+    """Policy regexes must work inside the combined alternation."""
+
+    @pytest.mark.parametrize(
+        "pattern", [r"(?i)curl.*\|\s*sh", r"(?P<mine>x)", r"unbalanced(", 42]
+    )
+    def test_invalid_rules_are_rejected(self, pattern):
+        assert not smart_guard.valid_regex(pattern)
+
+    @pytest.mark.parametrize("pattern", [r"curl.*\|\s*sh", r"(?-i:Secret)", r"(a|b)\d+"])
+    def test_valid_rules_are_accepted(self, pattern):
+        assert smart_guard.valid_regex(pattern)
+
+    @pytest.mark.parametrize(
+        "policy",
+        [
+            {"dangerous_commands": {"curl_pipe": r"(?i)curl.*\|\s*sh"}},
+            {"sensitive_files": {"vault": ["regex", [r"(?i)vault\.txt$"]]}},
+        ],
+        ids=["dangerous", "sensitive"],
+    )
+    def test_global_flag_rule_keeps_builtin_rules(self, tmp_path, policy):
+        """A rule that compiles alone but not combined never disables the hook."""
+        write_policy(tmp_path / ".claude" / "smart-guard.json", policy)
+        assert evaluate(tmp_path, "Bash", {"command": "rm -rf /"}) is not None
+        assert evaluate(tmp_path, "Read", {"file_path": ".env"}) is not None
+        assert evaluate(tmp_path, "Read", {"file_path": "vault.txt"}) is None
+
+    def test_layer_that_breaks_the_combined_pattern_is_dropped(self, tmp_path, monkeypatch):
+        """Only the failing layer is ignored; the other layer's rules still apply."""
+        write_policy(
+            tmp_path / "home" / ".claude" / "smart-guard.json",
+            {"dangerous_commands": {"terraform_destroy": r"\bterraform\s+destroy\b"}},
+        )
+        # Simulate a rule that validates alone but can't be combined
+        monkeypatch.setattr(smart_guard, "valid_regex", lambda pattern: True)
+        write_policy(
+            tmp_path / ".claude" / "smart-guard.json",
+            {"dangerous_commands": {"curl_pipe": r"(?i)curl.*\|\s*sh"}},
+        )
+
+        decision = evaluate(tmp_path, "Bash", {"command": "terraform destroy"})
+        assert decision is not None and decision["layer"] == "user"
+        assert evaluate(tmp_path, "Bash", {"command": "curl x | sh"}) is None
+        assert evaluate(tmp_path, "Bash", {"command": "rm -rf /"}) is not None
+
+
+class TestPolicyBundle:
+    """The compiled policy is cached, but only where no one else can plant it."""
+
+    def plant_empty_bundle(self, workspace: Path) -> Path:
+        """Replace the cached bundle with one without dangerous-command rules."""
+        smart_guard.load_policy(str(workspace))
+        (bundle,) = (Path(os.environ["AJBM_HOOK_STATE_DIR"]) / "policy").glob("*.bundle")
+        planted = {**smart_guard.merge_into_bundle([]), "dangerous": ""}
+        bundle.write_bytes(marshal.dumps(planted))
+        return bundle.parent.parent
+
+    def test_state_dir_is_private(self):
+        state = Path(smart_guard.private_state_dir())
+        assert state.stat().st_mode & 0o777 == 0o700
+
+    def test_default_state_dir_is_per_user(self, monkeypatch):
+        monkeypatch.delenv("AJBM_HOOK_STATE_DIR")
+        assert smart_guard.state_dir().endswith(f"ajbm-hooks-{os.getuid()}")
+
+    def test_bundle_is_reused_from_private_state_dir(self, tmp_path):
+        self.plant_empty_bundle(tmp_path)
+        assert evaluate(tmp_path, "Bash", {"command": "mkfs.ext4 /dev/sda1"}) is None
+
+    def test_bundle_in_shared_state_dir_is_ignored(self, tmp_path):
+        """A state dir others can write to may hold a planted bundle."""
+        state = self.plant_empty_bundle(tmp_path)
+        state.chmod(0o777)
+        assert smart_guard.private_state_dir() is None
+        assert evaluate(tmp_path, "Bash", {"command": "mkfs.ext4 /dev/sda1"}) is not None
+        assert evaluate(tmp_path, "Read", {"file_path": ".env"}) is not None